@@ -0,0 +1,90 @@
+import math
+
+# result columns that are aggregated per strategy
+metrics = ['PlayerScore', 'PlayerWinRate', 'PlayerLossRate', 'PlayerTieRate']
+
+
+class Aggregator:
+    """Aggregator class - running mean and variance of each metric per PlayerStrategy, updated one
+    tournament at a time with Welford's method, so monte carlo results never have to be kept in memory.
+    Each player row is one observation, as in a groupby mean over the results table.
+
+    >>> a = Aggregator()
+    >>> a.update([{'PlayerStrategy': 'TFT', 'PlayerScore': 2.0, 'PlayerWinRate': 0.5, 'PlayerLossRate': 0.5,
+    ...            'PlayerTieRate': 0.0},
+    ...           {'PlayerStrategy': 'TFT', 'PlayerScore': 3.0, 'PlayerWinRate': 0.0, 'PlayerLossRate': 0.5,
+    ...            'PlayerTieRate': 0.5}])
+    >>> a.update([{'PlayerStrategy': 'TFT', 'PlayerScore': 4.0, 'PlayerWinRate': 1.0, 'PlayerLossRate': 0.0,
+    ...            'PlayerTieRate': 0.0}])
+    >>> a.mean('TFT', 'PlayerScore'), a.variance('TFT', 'PlayerScore')
+    (3.0, 1.0)
+    >>> round(a.half_width('TFT', 'PlayerScore'), 4)
+    1.1316
+    >>> a.converged(precision=2.0), a.converged(precision=1.0)
+    (True, False)
+    >>> a.summary().loc['TFT', ['Count', 'PlayerScoreMean', 'PlayerScoreStd']].tolist()
+    [3.0, 3.0, 1.0]
+    """
+
+    def __init__(self, z=1.96):
+        """
+        :param z: normal quantile of the confidence intervals, 1.96 for 95% intervals
+        """
+        self.z = z
+        self.count = {}  # observations per strategy
+        self.means = {}  # running mean of each metric per strategy
+        self.squares = {}  # running sum of squared differences from the mean of each metric per strategy
+
+    def update(self, rows: list):
+        """This adds the result rows of one tournament"""
+        for row in rows:
+            strategy = row['PlayerStrategy']
+            if strategy not in self.count:
+                self.count[strategy] = 0
+                self.means[strategy] = [0.0] * len(metrics)
+                self.squares[strategy] = [0.0] * len(metrics)
+            n = self.count[strategy] + 1
+            self.count[strategy] = n
+            means = self.means[strategy]
+            squares = self.squares[strategy]
+            for i, metric in enumerate(metrics):
+                x = row[metric]
+                delta = x - means[i]
+                means[i] += delta / n
+                squares[i] += delta * (x - means[i])
+
+    def mean(self, strategy, metric):
+        return self.means[strategy][metrics.index(metric)]
+
+    def variance(self, strategy, metric):
+        """Sample variance of a metric for a strategy, 0 with a single observation"""
+        n = self.count[strategy]
+        return self.squares[strategy][metrics.index(metric)] / (n - 1) if n > 1 else 0.0
+
+    def half_width(self, strategy, metric):
+        """Half-width of the confidence interval of a metric's mean for a strategy"""
+        n = self.count[strategy]
+        if n < 2:
+            return math.inf
+        return self.z * math.sqrt(self.variance(strategy, metric) / n)
+
+    def converged(self, precision):
+        """True once the confidence interval half-width of every metric of every strategy is below precision"""
+        return bool(self.count) and all(self.half_width(strategy, metric) < precision
+                                        for strategy in self.count for metric in metrics)
+
+    def summary(self):
+        """
+        This returns the aggregated results as a pandas dataframe, one row per strategy, with the number of
+        observations and the mean, standard deviation and confidence interval half-width of each metric
+        """
+        import pandas as pd
+        table = []
+        for strategy in self.count:
+            row = {'PlayerStrategy': strategy, 'Count': self.count[strategy]}
+            for metric in metrics:
+                row[metric + 'Mean'] = self.mean(strategy, metric)
+                row[metric + 'Std'] = math.sqrt(self.variance(strategy, metric))
+                row[metric + 'CI'] = self.half_width(strategy, metric)
+            table.append(row)
+        return pd.DataFrame(table).set_index('PlayerStrategy')
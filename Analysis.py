@@ -0,0 +1,240 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import Aggregator
+
+# result columns an analysis reads, the metrics are those of Aggregator
+readColumns = ['TournamentID', 'PlayerStrategy'] + Aggregator.metrics
+
+# mean scores closer than this are a tie when strategies are ranked, as equal averages summed in a different order
+# can differ in their last bits
+tieTolerance = 1e-9
+
+
+class Analysis:
+    """Analysis class - per-strategy statistics of monte carlo results, updated a chunk of whole tournaments at a
+    time with vectorised numpy operations, so result files of any size are analysed in bounded memory
+    (see analyse, which streams a results file through it).
+    It keeps, for each strategy and metric:
+    - the count, mean and standard deviation over player rows, as in a groupby mean over the results table
+    - bootstrap confidence intervals of the mean, from a Poisson bootstrap over tournaments: each tournament weighs
+      in each replicate by a Poisson(1) draw, so replicates are built in one pass without resampling the file.
+      Tournaments are resampled rather than rows, as the players of a tournament play each other
+    - the distribution of each strategy's rank in the tournaments it played, ranked by the mean score of its
+      players in the tournament (1 is the highest, tied strategies share the best rank)
+
+    >>> import pandas as pd
+    >>> results = pd.DataFrame({'TournamentID': [1, 1, 1, 2, 2, 2], 'PlayerStrategy': ['TFT', 'AllD', 'TFT'] * 2,
+    ...                         'PlayerScore': [3.0, 2.0, 2.0, 1.0, 2.0, 2.0], 'PlayerWinRate': 0.5,
+    ...                         'PlayerLossRate': 0.5, 'PlayerTieRate': 0.0})
+    >>> a = Analysis(bootstrap=200, seed=1)
+    >>> a.update(results[:3])
+    >>> a.update(results[3:])
+    >>> s = a.summary()
+    >>> s.index.tolist(), s['Count'].tolist(), s['PlayerScoreMean'].tolist()
+    (['TFT', 'AllD'], [4, 2], [2.0, 2.0])
+    >>> bool(s.loc['TFT', 'PlayerScoreLow'] < 2.0 < s.loc['TFT', 'PlayerScoreHigh'])
+    True
+    >>> a.ranks()
+            1    2  MeanRank  Tournaments
+    TFT   0.5  0.5       1.5            2
+    AllD  0.5  0.5       1.5            2
+    """
+
+    def __init__(self, bootstrap=1000, confidence=0.95, seed=None, block=2 ** 20):
+        """
+        :param bootstrap: number of bootstrap replicates
+        :param confidence: confidence level of the bootstrap intervals
+        :param seed: seed of the bootstrap weights, the intervals are the same for a seed whatever the chunk size
+        :param block: most values held at once by the bootstrap weights and the rank comparisons
+        """
+        self.bootstrap = bootstrap
+        self.confidence = confidence
+        self.rng = np.random.default_rng(seed)
+        self.block = block
+        self.strategies = []  # strategy ids, by code
+        self.codes = {}  # code of each strategy id
+        size = len(Aggregator.metrics)
+        self.count = np.zeros(0)  # player rows per strategy
+        self.means = np.zeros((0, size))  # mean of each metric per strategy
+        self.squares = np.zeros((0, size))  # sum of squared differences from the mean of each metric per strategy
+        self.bootCounts = np.zeros((bootstrap, 0))  # weighted player rows per replicate and strategy
+        self.bootSums = np.zeros((bootstrap, 0, size))  # weighted sum of each metric per replicate and strategy
+        self.rankCounts = np.zeros((0, 0), dtype=np.int64)  # tournaments each strategy took each rank in
+
+    def update(self, results):
+        """
+        This adds a chunk of results, a pandas dataframe with readColumns. Every row of a tournament must be
+        in the same chunk, as given by read_chunks
+        """
+        codes = self._encode(results['PlayerStrategy'].tolist())
+        values = results[Aggregator.metrics].to_numpy(dtype=np.float64)
+        tournaments, t = np.unique(results['TournamentID'].to_numpy(), return_inverse=True)
+        n, m, size = len(tournaments), len(self.strategies), len(Aggregator.metrics)
+
+        # player rows and metric sums per tournament and strategy
+        cells = t * m + codes
+        counts = np.bincount(cells, minlength=n * m).reshape(n, m).astype(np.float64)
+        sums = np.stack([np.bincount(cells, values[:, k], minlength=n * m) for k in range(size)], axis=1)
+        sums = sums.reshape(n, m, size)
+
+        # counts, means and squared differences of the chunk, merged into the totals (Chan et al.)
+        count = counts.sum(axis=0)
+        seen = count > 0
+        means = np.zeros((m, size))
+        means[seen] = sums.sum(axis=0)[seen] / count[seen, None]
+        squares = np.stack([np.bincount(codes, (values[:, k] - means[codes, k]) ** 2, minlength=m)
+                            for k in range(size)], axis=1)
+        total = self.count + count
+        delta = means - self.means
+        weight = np.divide(count, total, out=np.zeros(m), where=total > 0)
+        self.squares += squares + delta ** 2 * (self.count * weight)[:, None]
+        self.means += delta * weight[:, None]
+        self.count = total
+
+        # bootstrap replicates, a block of tournaments at a time
+        step = max(1, self.block // max(self.bootstrap, m * m))
+        for start in range(0, n, step):
+            stop = min(start + step, n)
+            weights = self.rng.poisson(1.0, (stop - start, self.bootstrap)).astype(np.float64)
+            self.bootCounts += weights.T @ counts[start:stop]
+            self.bootSums += (weights.T @ sums[start:stop].reshape(stop - start, -1)).reshape(-1, m, size)
+
+            # rank of each strategy in each tournament: one more than the strategies that scored higher
+            played = counts[start:stop] > 0
+            scores = np.where(played, sums[start:stop, :, 0] / np.where(played, counts[start:stop], 1), np.nan)
+            ranks = (scores[:, None, :] > scores[:, :, None] + tieTolerance).sum(axis=2)
+            strategy = np.broadcast_to(np.arange(m), ranks.shape)
+            self.rankCounts += np.bincount(strategy[played] * m + ranks[played], minlength=m * m).reshape(m, m)
+
+    def _encode(self, strategies):
+        # codes of the strategies of a chunk, strategies seen for the first time get the next codes
+        for strategy in dict.fromkeys(strategies):
+            if strategy not in self.codes:
+                self.codes[strategy] = len(self.strategies)
+                self.strategies.append(strategy)
+        m = len(self.strategies)
+        grow = m - len(self.count)
+        if grow:
+            self.count = np.pad(self.count, (0, grow))
+            self.means = np.pad(self.means, ((0, grow), (0, 0)))
+            self.squares = np.pad(self.squares, ((0, grow), (0, 0)))
+            self.bootCounts = np.pad(self.bootCounts, ((0, 0), (0, grow)))
+            self.bootSums = np.pad(self.bootSums, ((0, 0), (0, grow), (0, 0)))
+            self.rankCounts = np.pad(self.rankCounts, ((0, grow), (0, grow)))
+        return np.array([self.codes[strategy] for strategy in strategies], dtype=np.int64)
+
+    def summary(self):
+        """
+        This returns a pandas dataframe, one row per strategy sorted by mean score (as in analysis.ipynb), with
+        the number of player rows and the mean, standard deviation and bootstrap interval (Low, High) of each metric
+        """
+        import pandas as pd
+        count = self.count
+        std = np.sqrt(np.divide(self.squares, (count - 1)[:, None], out=np.zeros_like(self.squares),
+                                where=(count > 1)[:, None]))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            replicates = self.bootSums / self.bootCounts[:, :, None]
+        tail = (1 - self.confidence) / 2 * 100
+        low, high = np.nanpercentile(replicates, [tail, 100 - tail], axis=0)
+        table = {'Count': count.astype(np.int64)}
+        for k, metric in enumerate(Aggregator.metrics):
+            table[metric + 'Mean'] = self.means[:, k]
+            table[metric + 'Std'] = std[:, k]
+            table[metric + 'Low'] = low[:, k]
+            table[metric + 'High'] = high[:, k]
+        summary = pd.DataFrame(table, index=pd.Index(self.strategies, name='PlayerStrategy'))
+        return summary.sort_values(by='PlayerScoreMean', ascending=False, kind='stable')
+
+    def ranks(self):
+        """
+        This returns a pandas dataframe, one row per strategy sorted by mean rank, with the share of the tournaments
+        a strategy played in that it took each rank (columns 1, 2, ...), its mean rank and how many tournaments it
+        played in
+        """
+        import pandas as pd
+        tournaments = self.rankCounts.sum(axis=1)
+        shares = self.rankCounts / np.maximum(tournaments, 1)[:, None]
+        ranks = pd.DataFrame(shares, index=self.strategies, columns=range(1, len(self.strategies) + 1))
+        ranks['MeanRank'] = shares @ np.arange(1, len(self.strategies) + 1)
+        ranks['Tournaments'] = tournaments
+        return ranks.sort_values(by='MeanRank', kind='stable')
+
+
+def read_chunks(path: str, chunksize=500000):
+    """
+    Read a results file in chunks of about chunksize rows, each holding whole tournaments, so only a chunk is ever
+    in memory. The rows of a tournament must follow one another, as run_MCsim writes them
+    :param path: a csv file of results, or a folder of columns written by ResultWriter.ColumnWriter
+    :param chunksize: number of rows read at a time
+    :return: a generator of pandas dataframes with readColumns
+    """
+    import pandas as pd
+    if os.path.isdir(path):
+        import ResultWriter
+        columns, categories = ResultWriter.read_columns(path)
+        strategies = np.array(categories['PlayerStrategy'], dtype=object)
+        rows = len(columns['TournamentID'])
+        chunks = (pd.DataFrame({column: strategies[columns[column][start:start + chunksize]]
+                                if column == 'PlayerStrategy' else columns[column][start:start + chunksize]
+                                for column in readColumns})
+                  for start in range(0, rows, chunksize))
+    else:
+        chunks = pd.read_csv(path, usecols=readColumns, chunksize=chunksize)
+
+    # the rows of the last tournament of a chunk go with the next chunk, as it may go on there
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        ids = chunk['TournamentID'].to_numpy()
+        last = len(ids) - int(np.argmax(ids[::-1] != ids[-1])) if (ids != ids[-1]).any() else 0
+        carry = chunk[last:]
+        if last:
+            yield chunk[:last]
+    if carry is not None and len(carry):
+        yield carry
+
+
+def analyse(path: str, chunksize=500000, bootstrap=1000, confidence=0.95, seed=None):
+    """
+    Stream a results file through an Analysis, a chunk of whole tournaments at a time
+    :param path: a csv file of results, or a folder of columns written by ResultWriter.ColumnWriter
+    :param chunksize: number of rows read at a time
+    :return: the Analysis, see Analysis.summary and Analysis.ranks
+
+    >>> a = analyse('Results/allStrategiesOnce.csv', chunksize=5000, bootstrap=100, seed=1)
+    >>> a.summary()['PlayerScoreMean'].round(6).head(3).to_dict()
+    {'SM': 2.432403, 'TFTT': 2.418197, 'GRAD': 2.415195}
+    >>> b = analyse('Results/allStrategiesOnce.csv', chunksize=3001, bootstrap=100, seed=1)
+    >>> np.allclose(b.summary(), a.summary(), rtol=1e-12), b.ranks().equals(a.ranks())
+    (True, True)
+    """
+    analysis = Analysis(bootstrap, confidence, seed)
+    for chunk in read_chunks(path, chunksize):
+        analysis.update(chunk)
+    return analysis
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Per-strategy statistics and rank distributions of monte carlo '
+                                                 'results, read in chunks.')
+    parser.add_argument('path', help='csv file of results, or folder of columns (npy format)')
+    parser.add_argument('--chunksize', type=int, default=500000, help='rows read at a time (default 500000)')
+    parser.add_argument('--bootstrap', type=int, default=1000, help='bootstrap replicates (default 1000)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level (default 0.95)')
+    parser.add_argument('--seed', type=int, help='seed of the bootstrap')
+    args = parser.parse_args(args)
+
+    analysis = analyse(args.path, args.chunksize, args.bootstrap, args.confidence, args.seed)
+    print(analysis.summary().to_string())
+    print()
+    print(analysis.ranks().to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import numpy as np
+
+import Game
+import Player
+import StateMachine
+import Strategy
+
+
+class BatchGame:
+    """BatchGame class - plays many Games in lockstep. Every game's moves, noise and scores are kept in NumPy arrays,
+    so one round is advanced for all games at once instead of one game at a time.
+    The noise rules and game modes are the same as in Game.
+
+    >>> p1 = Player.Player(strategy=Strategy.AlwaysCooperate)
+    >>> p2 = Player.Player(strategy=Strategy.AlwaysDefect)
+    >>> p3 = Player.Player(strategy=Strategy.TitForTat)
+    >>> bg = BatchGame([p1, p1, p2], [p2, p3, p3], noiseMax=0)
+    >>> bg.p1Strategies
+    ['AllC', 'AllC', 'AllD']
+    >>> bg.play_game()
+    >>> bg.p1Scores.tolist()
+    [0, 300, 104]
+    >>> bg.p2Scores.tolist()
+    [500, 300, 99]
+    >>> p3.wins, p3.ties, p3.losses
+    (0, 1, 1)
+    """
+
+    def __init__(self, p1s: list, p2s: list, rounds=100, noise_growthMax=0.01, noiseMax=0.5, rng=None):
+        assert len(p1s) == len(p2s), "Each game needs a player 1 and a player 2"
+        self.p1s = p1s
+        self.p2s = p2s
+        self.rounds = rounds
+        self.noise_growthMax = noise_growthMax  # must be between 0 and 1
+        self.noiseMax = noiseMax  # must be between 0 and 1
+        self.size = len(p1s)
+
+        # random generator used for noise and random moves
+        if rng is None:
+            rng = np.random.default_rng()
+        self.rng = rng
+
+        # shortcut for player strategies
+        self.p1Strategies = [p.strategy.id for p in p1s]
+        self.p2Strategies = [p.strategy.id for p in p2s]
+
+        # keep track of scores
+        self.p1Scores = np.zeros(self.size, dtype=np.int64)
+        self.p2Scores = np.zeros(self.size, dtype=np.int64)
+
+        # keep track of final noise levels
+        self.noise = self.set_noise()
+
+        # payoffs
+        self.payoffs = self.set_payoffs()
+        self.implementNoise = self.set_mode()
+
+    def set_noise(self, max=0.5):
+        """This sets the starting noise level of every game - a random value between 0 and the max (default .5)"""
+        return self.rng.uniform(0, max, self.size)
+
+    def set_mode(self, mode='I'):
+        """Determines whether payoffs are determined by a player's actual moves (misperception) or the moves
+        possibly changed by noise (misimplementation)"""
+        return Game.check_mode(mode)
+
+    def set_payoffs(self, T: int = 5, R: int = 3, P: int = 1, S: int = 0):
+        """This sets the payoffs for the games, determining how many points each player gets per round."""
+        return Game.check_payoffs(T, R, P, S)
+
+    def payoff_table(self):
+        """This returns the payoffs as a 2x2 table, indexed by [my move, their move] move codes"""
+        T, R, P, S = self.payoffs
+        return np.array([[R, S], [T, P]], dtype=np.int64)
+
+    def play_game(self):
+        """This plays through every game for the set number of rounds, then sends the players their results."""
+        table = StateMachine.MachineTable([type(p.strategy) for p in self.p1s + self.p2s], self.rounds)
+        side1 = _Side(self.p1s, table, self.rng)
+        side2 = _Side(self.p2s, table, self.rng)
+        payoffs = self.payoff_table()
+        g = self.noise_growthMax
+
+        for r in range(self.rounds):
+            # get moves, as determined by each player's strategy
+            p1moves = side1.next_moves()
+            p2moves = side2.next_moves()
+
+            # generate random value for each player to be compared to the noise
+            chances = self.rng.random((2, self.size))
+
+            # increase noise if defection occurred, twice as much for mutual defection; reduce if both cooperate
+            defections = p1moves + p2moves
+            incrementor = self.rng.uniform(0, g, self.size)
+            incrementor *= np.where(defections == 0, -1.0, defections)
+
+            # increment noise, make sure noise stays between 0 and max
+            self.noise += incrementor
+            np.clip(self.noise, 0, self.noiseMax, out=self.noise)
+
+            # use noise to possibly flip moves
+            p1PerMoves = p1moves ^ (chances[0] < self.noise)
+            p2PerMoves = p2moves ^ (chances[1] < self.noise)
+
+            # use game mode to determine if real moves or noisy moves are used to award payoffs
+            if self.implementNoise:
+                self.p1Scores += payoffs[p1PerMoves, p2PerMoves]
+                self.p2Scores += payoffs[p2PerMoves, p1PerMoves]
+            else:
+                self.p1Scores += payoffs[p1moves, p2moves]
+                self.p2Scores += payoffs[p2moves, p1moves]
+
+            # each player perceives its own real move and its opponent's perceived move
+            side1.remember(p1moves, p2PerMoves)
+            side2.remember(p2moves, p1PerMoves)
+
+        # send players their scores and win/lose/tie results
+        for p1, p2, p1Score, p2Score in zip(self.p1s, self.p2s, self.p1Scores.tolist(), self.p2Scores.tolist()):
+            Game.award(p1, p2, p1Score, p2Score, self.rounds)
+
+
+class _Side:
+    """The state of one side (player 1 or player 2) of every game in a BatchGame:
+    the state of each player's compiled strategy machine (see StateMachine)."""
+
+    def __init__(self, players: list, table: StateMachine.MachineTable, rng):
+        self.table = table
+        self.rng = rng
+        self.states = np.array([table.first[p.strategy.id] for p in players], dtype=np.int32)
+
+    def next_moves(self):
+        """This returns every game's next move for this side"""
+        moves = self.table.moves[self.states]
+        random = moves == StateMachine.randomMove
+        if random.any():
+            moves[random] = self.rng.integers(0, 2, int(random.sum()), dtype=np.uint8)
+        return moves
+
+    def remember(self, myMoves, theirMoves):
+        """This moves every machine to its next state after a perceived round"""
+        self.states = self.table.transitions[self.states, 2 * myMoves + theirMoves]
@@ -0,0 +1,177 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import Game
+import Player
+import Strategy
+import Tournament
+
+# population sizes of the play_tournament benchmarks for each engine.
+# Populations have the same number of players of every strategy.
+populations = {'game': [16, 64, 256, 1024], 'batch': [16, 64, 256, 1024]}
+
+# game engine tournaments of more players than this are timed once, as one of them takes minutes
+slowPopulation = 256
+
+
+def calibrate():
+    """This times a fixed piece of plain Python, to tell how fast the machine runs the interpreter at the moment"""
+    start = time.perf_counter()
+    total = 0
+    for i in range(100000):
+        total += i % 7
+    return time.perf_counter() - start
+
+
+def measure(name, run, rounds, repeat=3):
+    """
+    Time a benchmark and measure its peak memory.
+    The time is the best of repeat runs, and peak memory is taken in one more run with tracemalloc on,
+    as tracing slows the code down. Each timed run is paired with a calibration run, so compare can
+    allow for the machine being slower or faster than when the baseline was taken.
+    :param name: name of the benchmark
+    :param run: function with no arguments that runs the benchmark once
+    :param rounds: number of game rounds played by one run
+    :param repeat: number of timed runs
+    :return: a dict with the benchmark's name, rounds, seconds, roundsPerSec, peakMemory (bytes) and calibration
+
+    >>> result = measure('AllC vs AllD', lambda: play_pair(Strategy.AlwaysCooperate, Strategy.AlwaysDefect), 2000)
+    >>> sorted(result)
+    ['calibration', 'name', 'peakMemory', 'rounds', 'roundsPerSec', 'seconds']
+    """
+    seconds = []
+    calibration = []
+    for r in range(repeat):
+        calibration.append(calibrate())
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(seconds)
+    return {'name': name, 'rounds': rounds, 'seconds': best, 'roundsPerSec': rounds / best, 'peakMemory': peak,
+            'calibration': min(calibration)}
+
+
+def play_pair(strategy1, strategy2, rounds=100, games=20):
+    """This plays games between new players of two strategies, with fixed seeds"""
+    for seed in range(games):
+        game = Game.Game(Player.Player(strategy1), Player.Player(strategy2), rounds, seed=seed)
+        game.play_game()
+
+
+def play_long_game(rounds=10000):
+    """This plays a single long game with Game.play_game, so the innermost loop of the game engine is timed as
+    tournaments run it"""
+    game = Game.Game(Player.Player(Strategy.TitForTat), Player.Player(Strategy.Random), rounds, seed=1)
+    game.play_game()
+
+
+def run_suite(quick=False, repeat=3):
+    """
+    Run every benchmark: a long game, play_game for every strategy pair, play_tournament as the population grows
+    to about 1000 players (for both engines) and run_MCsim end to end.
+    :param quick: only run the play_tournament benchmarks up to 64 players
+    :param repeat: number of timed runs of each benchmark, game engine tournaments past slowPopulation are timed once
+    :return: a dict of form {benchmark name: result of measure}
+    """
+    results = []
+    results.append(measure('long game', play_long_game, 10000, repeat))
+
+    for strategy1 in Tournament.allStrategies:
+        for strategy2 in Tournament.allStrategies:
+            name = 'play_game {} vs {}'.format(strategy1().id, strategy2().id)
+            results.append(measure(name, lambda: play_pair(strategy1, strategy2), 20 * 100, repeat))
+
+    for engine, sizes in populations.items():
+        for size in sizes:
+            if quick and size > 64:
+                continue
+            strategies = Tournament.allStrategies
+            players = Tournament.create_playerlist({strategy: size // len(strategies) for strategy in strategies})
+            rounds = size * (size - 1) // 2 * 100
+            runs = 1 if engine == 'game' and size > slowPopulation else repeat
+            results.append(measure('play_tournament {} {} players'.format(engine, size),
+                                   lambda: Tournament.play_tournament(players, engine=engine, seed=1), rounds, runs))
+
+    players = Tournament.create_playerlist({strategy: 2 for strategy in Tournament.allStrategies})
+    rounds = 20 * 32 * 31 // 2 * 100
+    results.append(measure('run_MCsim 20 tournaments 32 players',
+                           lambda: Tournament.run_MCsim(players, times=20, seed=1), rounds, repeat))
+
+    return {result['name']: result for result in results}
+
+
+def compare(results: dict, baseline: dict, threshold=0.2):
+    """
+    Compare benchmark results against a baseline. Speeds are scaled by the calibration of both,
+    so a machine that is busier than when the baseline was taken doesn't show up as a regression.
+    :param results: benchmark results, as returned by run_suite
+    :param baseline: benchmark results of the baseline
+    :param threshold: largest fraction rounds/sec may drop or peak memory may grow before it counts as a regression
+    :return: a list of messages, one per regression
+
+    >>> baseline = {'long game': {'roundsPerSec': 100000.0, 'peakMemory': 1000, 'calibration': 0.01}}
+    >>> compare({'long game': {'roundsPerSec': 90000.0, 'peakMemory': 1000, 'calibration': 0.01}}, baseline)
+    []
+    >>> compare({'long game': {'roundsPerSec': 50000.0, 'peakMemory': 1000, 'calibration': 0.02}}, baseline)
+    []
+    >>> compare({'long game': {'roundsPerSec': 50000.0, 'peakMemory': 1500, 'calibration': 0.01}}, baseline)
+    ['long game: 50000 rounds/sec, baseline 100000 (-50%)', 'long game: peak memory 1500 bytes, baseline 1000 (+50%)']
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        machine = result['calibration'] / base['calibration']
+        speed = result['roundsPerSec'] * machine / base['roundsPerSec'] - 1
+        if speed < -threshold:
+            regressions.append('{}: {:.0f} rounds/sec, baseline {:.0f} ({:+.0%})'
+                               .format(name, result['roundsPerSec'], base['roundsPerSec'], speed))
+        memory = result['peakMemory'] / max(base['peakMemory'], 1) - 1
+        if memory > threshold:
+            regressions.append('{}: peak memory {} bytes, baseline {} ({:+.0%})'
+                               .format(name, result['peakMemory'], base['peakMemory'], memory))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation's hot paths.")
+    parser.add_argument('--save', metavar='FILE', help='write the results to a baseline JSON file')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fraction rounds/sec may drop or peak memory may grow before failing (default 0.2)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each benchmark (default 3)')
+    parser.add_argument('--quick', action='store_true', help='only run play_tournament up to 64 players')
+    args = parser.parse_args(args)
+
+    results = run_suite(args.quick, args.repeat)
+    for result in results.values():
+        print('{:<45} {:>14,.0f} rounds/sec {:>12,} bytes'.format(result['name'], result['roundsPerSec'],
+                                                                  result['peakMemory']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+import BatchGame
+import Game
+import Player
+import Strategy
+import Tournament
+
+
+def payoff_matrix(strategies=None, games=100, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode='I',
+                  payoffs=(5, 3, 1, 0), engine='batch', seed=None):
+    """
+    Estimate the expected score per round of each strategy against each other strategy (itself included),
+    from games simulated with the game rules of Tournament. Matrices are cached by their arguments,
+    so the games behind one are only played once.
+    :param strategies: list of strategy classes, Tournament.allStrategies if not given
+    :param games: number of games played between each pair of strategies
+    :param numrounds: number of rounds played in each game
+    :param noisegrowth: max noise increment
+    :param noisemax: max noise per game
+    :param mode: game mode, misimplementation (I) or misperception (P)
+    :param payoffs: (T, R, P, S) payoffs of every game
+    :param engine: play the games one at a time ('game') or in lockstep as arrays ('batch')
+    :param seed: seed that makes the estimate reproducible
+    :return: a pandas dataframe, entry [row, column] is the mean score per round of the row strategy against
+             the column strategy, indexed by strategy id both ways
+
+    >>> m = payoff_matrix([Strategy.AlwaysCooperate, Strategy.AlwaysDefect, Strategy.TitForTat], noisemax=0)
+    >>> m.loc['AllD'].tolist()
+    [5.0, 1.0, 1.04]
+    """
+    if strategies is None:
+        strategies = Tournament.allStrategies
+    matrix = _payoff_matrix(tuple(strategies), games, numrounds, noisegrowth, noisemax, mode, tuple(payoffs),
+                            engine, seed)
+    ids = [strategy().id for strategy in strategies]
+    return pd.DataFrame(matrix, index=pd.Index(ids, name='PlayerStrategy'), columns=ids)
+
+
+@functools.lru_cache(maxsize=32)
+def _payoff_matrix(strategies, games, numrounds, noisegrowth, noisemax, mode, payoffs, engine, seed):
+    # every unordered pair of strategies plays games games, both orders are read from the same games
+    pairs = [(i, j) for i in range(len(strategies)) for j in range(i, len(strategies))]
+    p1s = [Player.Player(strategies[i]) for i, j in pairs for game in range(games)]
+    p2s = [Player.Player(strategies[j]) for i, j in pairs for game in range(games)]
+    seed = np.random.SeedSequence(seed)
+
+    if engine == 'batch':
+        batch = BatchGame.BatchGame(p1s, p2s, numrounds, noisegrowth, noisemax, np.random.default_rng(seed))
+        batch.implementNoise = batch.set_mode(mode)
+        batch.payoffs = batch.set_payoffs(*payoffs)
+        batch.play_game()
+        p1Scores, p2Scores = batch.p1Scores, batch.p2Scores
+    elif engine == 'game':
+        p1Scores = np.zeros(len(p1s))
+        p2Scores = np.zeros(len(p2s))
+        game = None
+        for k, (p1, p2) in enumerate(zip(p1s, p2s)):
+            # one game is made, then reset for each pairing
+            if game is None:
+                game = Game.Game(p1, p2, numrounds, noisegrowth, noisemax, seed=seed.spawn(1)[0], retain='scores')
+                game.implementNoise = game.set_mode(mode)
+                game.payoffs = game.set_payoffs(*payoffs)
+            else:
+                game.reset(p1, p2, seed.spawn(1)[0])
+            game.play_game()
+            p1Scores[k], p2Scores[k] = game.p1Score, game.p2Score
+    else:
+        raise Exception("Engine must be 'game' or 'batch'.")
+
+    p1Means = p1Scores.reshape(len(pairs), games).mean(axis=1) / numrounds
+    p2Means = p2Scores.reshape(len(pairs), games).mean(axis=1) / numrounds
+    matrix = np.zeros((len(strategies), len(strategies)))
+    for (i, j), p1Mean, p2Mean in zip(pairs, p1Means, p2Means):
+        if i == j:
+            matrix[i, i] = (p1Mean + p2Mean) / 2
+        else:
+            matrix[i, j] = p1Mean
+            matrix[j, i] = p2Mean
+    matrix.setflags(write=False)
+    return matrix
+
+
+def replicator(matrix, shares=None, generations=1000):
+    """
+    Discrete-time replicator dynamics: each generation, the share of every strategy grows in proportion to
+    its fitness, its mean payoff against the population, relative to the population's mean fitness.
+    :param matrix: payoff matrix, as returned by payoff_matrix
+    :param shares: starting share of each strategy (same order as the matrix), equal shares if not given
+    :param generations: number of generations
+    :return: a pandas dataframe of the share of each strategy, one row per generation (generation 0 is the start)
+
+    >>> m = payoff_matrix([Strategy.AlwaysCooperate, Strategy.AlwaysDefect, Strategy.TitForTat], noisemax=0)
+    >>> replicator(m, generations=100).iloc[-1].round(3).tolist()
+    [0.206, 0.0, 0.794]
+    """
+    payoffs = np.asarray(matrix, dtype=float)
+    n = len(payoffs)
+    x = np.full(n, 1 / n) if shares is None else np.asarray(shares, dtype=float) / np.sum(shares)
+
+    history = np.empty((generations + 1, n))
+    history[0] = x
+    for generation in range(1, generations + 1):
+        fitness = payoffs @ x
+        x = x * fitness / (x @ fitness)
+        history[generation] = x
+
+    return _trajectory(history, matrix)
+
+
+def moran(matrix, population=1000, counts=None, generations=1000, selection=1.0, seed=None):
+    """
+    Moran process in a finite population: in each step one player, chosen in proportion to fitness, reproduces
+    and one player, chosen at random, is replaced by the offspring. A generation is population steps.
+    Fitness is 1 - selection + selection * (mean payoff against the rest of the population).
+    :param matrix: payoff matrix, as returned by payoff_matrix
+    :param population: number of players
+    :param counts: starting number of players of each strategy (same order as the matrix), as equal as possible
+                   if not given
+    :param generations: number of generations
+    :param selection: intensity of selection between 0 (neutral drift) and 1 (fitness is the payoff)
+    :param seed: seed that makes the process reproducible
+    :return: a pandas dataframe of the number of players of each strategy, one row per generation
+
+    >>> m = payoff_matrix([Strategy.AlwaysCooperate, Strategy.AlwaysDefect, Strategy.TitForTat], noisemax=0)
+    >>> result = moran(m, population=30, generations=200, seed=1)
+    >>> result.sum(axis=1).unique().tolist()
+    [30]
+    >>> result.iloc[-1].tolist()
+    [0, 30, 0]
+    """
+    payoffs = np.asarray(matrix, dtype=float).tolist()
+    n = len(payoffs)
+    if counts is None:
+        counts = [population // n + (i < population % n) for i in range(n)]
+    counts = list(counts)
+    population = sum(counts)
+    rng = np.random.default_rng(seed)
+
+    # total payoff of one player of each strategy against the whole population (itself included),
+    # kept up to date as players are replaced
+    totals = [sum(payoffs[i][j] * counts[j] for j in range(n)) for i in range(n)]
+
+    history = np.empty((generations + 1, n), dtype=np.int64)
+    history[0] = counts
+    for generation in range(1, generations + 1):
+        draws = rng.random((population, 2)).tolist()
+        for birthDraw, deathDraw in draws:
+            # the reproducing player is chosen in proportion to its strategy's total fitness
+            weights = [counts[i] * (1 - selection + selection * (totals[i] - payoffs[i][i]) / (population - 1))
+                       for i in range(n)]
+            target = birthDraw * sum(weights)
+            born = 0
+            while born < n - 1 and target >= weights[born]:
+                target -= weights[born]
+                born += 1
+
+            # the replaced player is chosen uniformly
+            target = deathDraw * population
+            died = 0
+            while died < n - 1 and target >= counts[died]:
+                target -= counts[died]
+                died += 1
+
+            if born != died:
+                counts[born] += 1
+                counts[died] -= 1
+                for i in range(n):
+                    totals[i] += payoffs[i][born] - payoffs[i][died]
+        history[generation] = counts
+
+    return _trajectory(history, matrix)
+
+
+def _trajectory(history, matrix):
+    columns = list(matrix.columns) if isinstance(matrix, pd.DataFrame) else None
+    trajectory = pd.DataFrame(history, columns=columns)
+    trajectory.index.name = 'Generation'
+    return trajectory
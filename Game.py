@@ -1,7 +1,14 @@
-import random
+from array import array
+
+import numpy as np
+
+import History
 import Player
 import Strategy
 
+# rounds of random values a game draws at a time, so a long game holds a bounded block of them whatever it retains
+drawBlock = 4096
+
 
 class Game:
     """Game class - two Players compete for a set number of rounds. The player with the most points wins.
@@ -35,16 +42,81 @@ class Game:
     0
     >>> g1.p2Score
     500
+
+    Every game owns its random generator, so a game can be replayed from its seed:
+
+    >>> p3 = Player.Player(strategy=Strategy.Random)
+    >>> g2 = Game(p3, p2)
+    >>> g2.play_game()
+    >>> g3 = Game(p3, p2, seed=g2.seed)
+    >>> g3.play_game()
+    >>> g2.gameHistory == g3.gameHistory
+    True
+
+    A game can keep only its last rounds, or only its scores and outcome counts:
+
+    >>> g4 = Game(p1, p2, noiseMax=0, retain=3)
+    >>> g4.play_game()
+    >>> g4.gameHistory
+    History([('C', 'D'), ('C', 'D'), ('C', 'D')])
+    >>> g5 = Game(p1, p2, noiseMax=0, retain='scores')
+    >>> g5.play_game()
+    >>> g5.outcomes
+    [0, 100, 0, 0]
+    >>> g5.gameHistory
+    Traceback (most recent call last):
+    Exception: Game keeps no history with retain='scores', use retain='full' or a number of rounds.
     """
     gameCount = 0
 
-    def __init__(self, p1: Player, p2: Player, rounds=100, noise_growthMax=0.01, noiseMax=0.5, name: str = None):
-        self.p1 = p1
-        self.p2 = p2
+    # a tournament plays its games one after another on one Game (see reset), which keeps its attributes in slots
+    __slots__ = ('p1', 'p2', 'rounds', 'noise_growthMax', 'noiseMax', 'p1Name', 'p2Name', 'p1Strategy', 'p2Strategy',
+                 'name', 'id', 'seed', 'rng', 'retain', 'traceSize', 'trace', 'lastCode', 'p1Score', 'p2Score',
+                 'roundCount', 'outcomes', 'noise', 'noiseTrace', 'blockStart', 'streams', 'p1Chances', 'p2Chances',
+                 'noiseDraws', 'p1RandomMoves', 'p2RandomMoves', 'payoffs', 'implementNoise')
+
+    def __init__(self, p1: Player, p2: Player, rounds=100, noise_growthMax=0.01, noiseMax=0.5, name: str = None,
+                 seed=None, retain='full'):
         self.rounds = rounds
         self.noise_growthMax = noise_growthMax # must be between 0 and 1
         self.noiseMax = noiseMax # must be between 0 and 1
 
+        # keep track of real and perceived moves in the game: one trace code per round, holding the real moves
+        # (bits 0-1, a History round code) and whether noise flipped player 1's (bit 2) or player 2's (bit 3) move.
+        # realHistory, p1History, p2History and gameHistory are all read from it.
+        # The trace and noise trace are rings of traceSize rounds, see set_retention()
+        self.retain = retain
+        self.traceSize = self.set_retention(retain)
+        self.trace = bytearray(self.traceSize)
+        self.noiseTrace = array('d', bytes(8 * self.traceSize))
+
+        # payoffs
+        self.payoffs = self.set_payoffs()
+        self.implementNoise = self.set_mode()
+
+        self.reset(p1, p2, seed, name)
+
+
+    def reset(self, p1: Player, p2: Player, seed=None, name: str = None):
+        """This starts a new game between two players on this game, which keeps its rounds, noise growth and max,
+        retention, payoffs and mode, and reuses its trace buffers.
+
+        >>> p1 = Player.Player(strategy=Strategy.TitForTat)
+        >>> p2 = Player.Player(strategy=Strategy.Random)
+        >>> g1 = Game(p1, p2, retain='scores', seed=3)
+        >>> g1.play_game()
+        >>> scores = (g1.p1Score, g1.p2Score)
+        >>> g1.reset(p2, p1, seed=3)
+        >>> g1.p1Strategy, g1.p1Score, g1.roundCount
+        ('RAND', 0, 0)
+        >>> g1.reset(p1, p2, seed=3)
+        >>> g1.play_game()
+        >>> (g1.p1Score, g1.p2Score) == scores
+        True
+        """
+        self.p1 = p1
+        self.p2 = p2
+
         # shortcut for player names & strategies
         self.p1Name = self.p1.name
         self.p2Name = self.p2.name
@@ -61,44 +133,100 @@ class Game:
         Game.gameCount += 1
         self.id = Game.gameCount
 
-        # keep track of real and perceived moves in the game
-        self.realHistory = []
-        self.p1History = []
-        self.p2History = []
-        self.gameHistory = []
+        # random generator of this game, from a seed (int or numpy SeedSequence) or fresh entropy
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        # the trace rings are overwritten as the game goes, only roundCount tells how much of them is read
+        self.lastCode = 0
 
-        # keep track of scores
+        # keep track of scores, and how often each outcome (CC, CD, DC, DD) determined the payoffs
         self.p1Score = 0
         self.p2Score = 0
+        self.roundCount = 0
+        self.outcomes = [0, 0, 0, 0]
 
         # keep track of final noise level
         self.noise = self.set_noise()
-        self.noiseHistory = []
-
-        # payoffs
-        self.payoffs = self.set_payoffs()
-        self.implementNoise = self.set_mode()
-
+        self.streams = None
+        self.draw_randoms()
 
     def set_noise(self, max=0.5):
         """This sets the starting noise level - a random value between 0 and the max (default .5)"""
-        return random.uniform(0, max)
+        return self.rng.uniform(0, max)
+
+    def draw_randoms(self, start=0):
+        """This draws the random values of the rounds from start on, a block of at most drawBlock rounds at a time:
+        each player's chance values (compared to the noise), the noise increments and each player's random moves.
+        A game of up to drawBlock rounds draws them all at once, as 5 rows of the game's random stream. A longer
+        game reads each row from its own copy of the stream, moved on to where the row starts, so every value is
+        the same as if the whole game had been drawn at once
+
+        >>> p1 = Player.Player(strategy=Strategy.Random)
+        >>> g1 = Game(p1, Player.Player(strategy=Strategy.TitForTat), rounds=drawBlock + 10, seed=2, retain='scores')
+        >>> g1.play_game()
+        >>> g1.blockStart, len(g1.p1Chances)
+        (4096, 4096)
+        >>> rng = np.random.default_rng(g1.seed)
+        >>> start = rng.uniform(0, 0.5)
+        >>> whole = rng.random((5, g1.rounds))
+        >>> g1.p1Chances[:10] == array('d', whole[0, drawBlock:])
+        True
+        """
+        self.blockStart = start
+        if self.rounds <= drawBlock:
+            block = self.rng.random((5, self.rounds))
+        else:
+            if start == 0:
+                self.streams = [self.row_stream(k) for k in range(5)]
+                self.rng.bit_generator.advance(5 * self.rounds)
+            # every block is drawBlock rounds long, the values past the last round are never read
+            block = np.stack([stream.random(drawBlock) for stream in self.streams])
+        block[2] *= self.noise_growthMax
+
+        # kept as compact arrays of doubles, which still read back as Python floats
+        self.p1Chances = array('d', block[0].tobytes())
+        self.p2Chances = array('d', block[1].tobytes())
+        self.noiseDraws = array('d', block[2].tobytes())
+
+        # only players with a random strategy need their random moves as letters
+        self.p1RandomMoves = []
+        self.p2RandomMoves = []
+        if isinstance(self.p1.strategy, Strategy.Random):
+            self.p1RandomMoves = [Strategy.moveLetters[m] for m in (block[3] < 0.5).tolist()]
+        if isinstance(self.p2.strategy, Strategy.Random):
+            self.p2RandomMoves = [Strategy.moveLetters[m] for m in (block[4] < 0.5).tolist()]
+
+    def row_stream(self, row):
+        """This returns a generator on a copy of the game's random stream, moved on to the start of a row"""
+        bitGenerator = type(self.rng.bit_generator)()
+        bitGenerator.state = self.rng.bit_generator.state
+        bitGenerator.advance(row * self.rounds)
+        return np.random.Generator(bitGenerator)
+
+    def set_retention(self, retain='full'):
+        """Determines how much of the game is kept: the full trace of every round ('full'),
+        only the last rounds (a number of rounds) or only the scores and outcome counts ('scores').
+        Returns the number of rounds the trace keeps."""
+        if retain == 'full':
+            return self.rounds
+        elif retain == 'scores':
+            return 0
+        elif isinstance(retain, int) and retain > 0:
+            return min(retain, self.rounds)
+        else:
+            raise Exception("Retain must be 'full', 'scores' or a number of rounds.")
 
     def set_mode(self, mode='I'):
         """Determines whether payoffs are determined by a player's actual moves (misperception) or the moves
         possibly changed by noise (misimplementation)"""
-        if mode in ['misperception', 'P', 'p']:
-            return False
-        elif mode in ['misimplementation', 'I', 'i']:
-            return True
-        else:
-            raise Exception("Mode must be 'P' for 'misperception', or 'I' for 'misimplementation'.")
+        return check_mode(mode)
 
     def set_payoffs(self, T: int = 5, R: int = 3, P: int = 1, S: int = 0):
         """This sets the payoffs for the game, determining how many points each player gets per round."""
-        assert T > R > P > S, "Payoffs must follow rule: T > R > P > S"
-        assert 2*R > T + S, "Payoffs must follow rule: 2*R > T + S"
-        return (T, R, P, S)
+        return check_payoffs(T, R, P, S)
 
     def flip(self, play):
         """This flips the player's move from 'C' to 'D' or from 'D' to 'C', if called due to noise"""
@@ -109,31 +237,36 @@ class Game:
 
     def play_round(self):
         """This plays through one round of the game. To be called once per round."""
+        # the random values of the next block are drawn once the last block's rounds are played
+        r = self.roundCount - self.blockStart
+        if r == drawBlock:
+            self.draw_randoms(self.roundCount)
+            self.p1.randomMoves = self.p1RandomMoves
+            self.p2.randomMoves = self.p2RandomMoves
+            r = 0
+
         # get moves, as determined by each player's strategy
         p1move = self.p1.strategy.next_move(self.p1)
         p2move = self.p2.strategy.next_move(self.p2)
 
         realMoves = (p1move, p2move)
 
-        # add real moves to real history
-        self.realHistory.append(realMoves)
-
         # account for noise
 
-        # add current noise to noise history
-        self.noiseHistory.append(self.noise)
+        # current noise, added to the noise history with the round
+        noise = self.noise
 
-        # generate random value for each player to be compared to the noise
-        p1chance = random.random()  # a value between 0 and 1
-        p2chance = random.random()  # a different value between 0 and 1
+        # random value for each player to be compared to the noise, drawn in advance by draw_randoms()
+        p1chance = self.p1Chances[r]  # a value between 0 and 1
+        p2chance = self.p2Chances[r]  # a different value between 0 and 1
 
         # increase noise if defection occurred
-        if realMoves is ('D', 'D'):
-            noiseIncrementor = random.uniform(0, self.noise_growthMax * 2)  # more noise for more defection
+        if realMoves == ('D', 'D'):
+            noiseIncrementor = self.noiseDraws[r] * 2  # more noise for more defection
         elif 'D' in realMoves:
-            noiseIncrementor = random.uniform(0, self.noise_growthMax)  # if only one player defects
+            noiseIncrementor = self.noiseDraws[r]  # if only one player defects
         else:
-            noiseIncrementor = (random.uniform(0, self.noise_growthMax)) * -1  # if both cooperate, reduce noise
+            noiseIncrementor = self.noiseDraws[r] * -1  # if both cooperate, reduce noise
 
         # increment noise, make sure noise stays between 0 and max
         self.noise += noiseIncrementor
@@ -155,12 +288,6 @@ class Game:
         else:
             p2PerMove = p2move
 
-        p1PerRound = (p1move, p2PerMove)  # P1's perceived history of the round
-        p2PerRound = (p2move, p1PerMove)  # P2's perceived history of the round
-
-        self.p1History.append(p1PerRound)
-        self.p2History.append(p2PerRound)
-
         # moves (potentially altered by noise) that will determine payoffs
         noisyMoves = (p1PerMove, p2PerMove)
 
@@ -193,45 +320,145 @@ class Game:
         self.p1Score += p1payoff
         self.p2Score += p2payoff
 
-        # send moves used to determine payoffs to game history
-        self.gameHistory.append(moves)
-
-
+        # count the outcome, add real moves and the moves flipped by noise to the trace
+        self.outcomes[History.roundCodes[moves]] += 1
+        self.lastCode = History.roundCodes[realMoves] | (p1PerMove != p1move) << 2 | (p2PerMove != p2move) << 3
+        if self.traceSize:
+            self.trace[self.roundCount % self.traceSize] = self.lastCode
+            self.noiseTrace[self.roundCount % self.traceSize] = noise
+        self.roundCount += 1
+
+    def retained(self, trace):
+        """This returns the rounds kept in a trace ring (trace or noiseTrace), oldest first"""
+        if not self.traceSize:
+            raise Exception("Game keeps no history with retain='scores', use retain='full' or a number of rounds.")
+        if self.roundCount <= self.traceSize:
+            return trace[:self.roundCount]
+        start = self.roundCount % self.traceSize
+        return trace[start:] + trace[:start]
+
+    @property
+    def realHistory(self):
+        """Real moves of every round kept"""
+        return History.History.from_codes(self.retained(self.trace).translate(realView))
+
+    @property
+    def p1History(self):
+        """P1's perceived history of every round kept: its own move and P2's move possibly changed by noise"""
+        return History.History.from_codes(self.retained(self.trace).translate(p1View))
+
+    @property
+    def p2History(self):
+        """P2's perceived history of every round kept: its own move and P1's move possibly changed by noise"""
+        return History.History.from_codes(self.retained(self.trace).translate(p2View))
+
+    @property
+    def gameHistory(self):
+        """Moves used to determine payoffs in every round kept, real or noisy depending on the game mode"""
+        view = noisyView if self.implementNoise else realView
+        return History.History.from_codes(self.retained(self.trace).translate(view))
+
+    @property
+    def noiseHistory(self):
+        """Noise level at the start of every round kept"""
+        return self.retained(self.noiseTrace)
+
+    def player_history(self, player: Player):
+        """This gives a player an empty history for the game. Unless the game keeps its full trace,
+        the history only keeps the rounds the player's strategy looks back on."""
+        lookback = player.strategy.lookback
+        if self.retain == 'full' or lookback is None:
+            return History.History(self.rounds)
+        return History.WindowHistory(max(lookback, 1))
 
     def send_history(self):
         """This sends the perceived moves to each player's own known history of the game.
         To be called after each round."""
         # get last moves (just played)
-        forP1 = self.p1History[-1]
-        forP2 = self.p2History[-1]
+        code = self.lastCode
 
-        # send to players's history
-        self.p1.history.append(forP1)
-        self.p2.history.append(forP2)
+        # send to players's history, which also updates their running opponent statistics
+        self.p1.remember(p1View[code])
+        self.p2.remember(p2View[code])
 
     def play_game(self):
         """This plays through an entire game between two players, for the set number of rounds."""
-        # reset player histories
-        self.p1.history = []
-        self.p2.history = []
+        # reset player histories, hand players their random moves for this game
+        self.p1.history = self.player_history(self.p1)
+        self.p2.history = self.player_history(self.p2)
+        self.p1.randomMoves = self.p1RandomMoves
+        self.p2.randomMoves = self.p2RandomMoves
 
         # play all rounds
         for r in range(self.rounds):
             self.play_round()
             self.send_history()
 
-        # send players their scores
-        self.p1.points += self.p1Score / self.rounds
-        self.p2.points += self.p2Score / self.rounds
-
-        # send players their win/lose/tie results
-        if self.p1Score == self.p2Score:
-            self.p1.ties += 1
-            self.p2.ties += 1
-        elif self.p1Score > self.p2Score:
-            self.p1.wins += 1
-            self.p2.losses += 1
-        elif self.p1Score < self.p2Score:
-            self.p1.losses += 1
-            self.p2.wins += 1
+        # send players their scores and win/lose/tie results
+        award(self.p1, self.p2, self.p1Score, self.p2Score, self.rounds)
+
+
+def _view(view):
+    """This builds a table turning Game.trace codes into History round codes, to be used with bytes.translate()"""
+    return bytes(view(code >> 1 & 1, code & 1, code >> 2 & 1, code >> 3 & 1) for code in range(256))
+
+
+# tables turning Game.trace codes into the round codes of each history, from real moves and flips of P1 and P2
+realView = _view(lambda p1move, p2move, p1flip, p2flip: 2 * p1move + p2move)
+p1View = _view(lambda p1move, p2move, p1flip, p2flip: 2 * p1move + (p2move ^ p2flip))
+p2View = _view(lambda p1move, p2move, p1flip, p2flip: 2 * p2move + (p1move ^ p1flip))
+noisyView = _view(lambda p1move, p2move, p1flip, p2flip: 2 * (p1move ^ p1flip) + (p2move ^ p2flip))
+
+
+def check_mode(mode='I'):
+    """This checks a game mode and returns whether payoffs are awarded on the moves possibly changed by noise
+    (misimplementation, True) or on the players' actual moves (misperception, False).
+    Shared by every engine and by the code that checks settings before any game is played.
+
+    >>> check_mode('P'), check_mode('misimplementation')
+    (False, True)
+    """
+    if mode in ['misperception', 'P', 'p']:
+        return False
+    elif mode in ['misimplementation', 'I', 'i']:
+        return True
+    else:
+        raise Exception("Mode must be 'P' for 'misperception', or 'I' for 'misimplementation'.")
+
+
+def check_payoffs(T: int = 5, R: int = 3, P: int = 1, S: int = 0):
+    """This checks the payoffs of a game, and returns them as a (T, R, P, S) tuple
+
+    >>> check_payoffs(4, 3, 1, 0)
+    (4, 3, 1, 0)
+    """
+    assert T > R > P > S, "Payoffs must follow rule: T > R > P > S"
+    assert 2*R > T + S, "Payoffs must follow rule: 2*R > T + S"
+    return (T, R, P, S)
+
+
+def award(p1: Player, p2: Player, p1Score, p2Score, rounds):
+    """This sends two players their average score per round and their win/lose/tie result for one game.
+    Shared by every engine that plays games, so players are scored the same way however the game was played.
+
+    >>> p1 = Player.Player(strategy=Strategy.AlwaysCooperate)
+    >>> p2 = Player.Player(strategy=Strategy.AlwaysDefect)
+    >>> award(p1, p2, 0, 500, 100)
+    >>> (p1.points, p1.losses, p2.points, p2.wins)
+    (0.0, 1, 5.0, 1)
+    """
+    # send players their scores
+    p1.points += p1Score / rounds
+    p2.points += p2Score / rounds
+
+    # send players their win/lose/tie results
+    if p1Score == p2Score:
+        p1.ties += 1
+        p2.ties += 1
+    elif p1Score > p2Score:
+        p1.wins += 1
+        p2.losses += 1
+    elif p1Score < p2Score:
+        p1.losses += 1
+        p2.wins += 1
 
@@ -0,0 +1,186 @@
+import Strategy
+
+# every possible round, indexed by its round code: 2 * first move code + second move code
+allRounds = [('C', 'C'), ('C', 'D'), ('D', 'C'), ('D', 'D')]
+roundCodes = {round: code for code, round in enumerate(allRounds)}
+
+
+class History:
+    """History class - the moves of a game, one pair of moves per round, e.g. ('C', 'D').
+    Each round is packed into a single round code (two bits) in a preallocated byte array,
+    so a game of any length takes one byte per round. Reads give back the same tuples of 'C'/'D' as a list would.
+
+    >>> h = History(rounds=2)
+    >>> h.append(('C', 'D'))
+    >>> h.append(('D', 'D'))
+    >>> h.append(('D', 'C'))
+    >>> len(h)
+    3
+    >>> h[0]
+    ('C', 'D')
+    >>> h[-1]
+    ('D', 'C')
+    >>> h[-2:]
+    [('D', 'D'), ('D', 'C')]
+    >>> h.count_second('D', 2)
+    1
+    >>> h == [('C', 'D'), ('D', 'D'), ('D', 'C')]
+    True
+    """
+
+    def __init__(self, rounds=100):
+        # round code of every round, preallocated for the expected number of rounds
+        self.codes = bytearray(rounds)
+        self.size = rounds
+        self.length = 0
+        self.last = 0  # round code of the last round
+
+    @classmethod
+    def from_moves(cls, moves):
+        """This builds a History from any sequence of rounds, e.g. a list of ('C', 'D') tuples"""
+        history = cls(len(moves))
+        for round in moves:
+            history.append(round)
+        return history
+
+    @classmethod
+    def from_codes(cls, codes):
+        """This builds a History from a sequence of round codes"""
+        history = cls(0)
+        history.codes = bytearray(codes)
+        history.size = history.length = len(codes)
+        if codes:
+            history.last = codes[-1]
+        return history
+
+    def append(self, moves):
+        """This adds one round (a pair of moves) to the end of the history"""
+        self.append_code(roundCodes[moves])
+
+    def append_code(self, code):
+        """This adds one round, given as a round code, to the end of the history"""
+        n = self.length
+        if n == self.size:
+            # grow past the preallocated size, doubling so appends stay cheap
+            self.codes.extend(bytes(self.size or 1))
+            self.size = len(self.codes)
+        self.codes[n] = code
+        self.length = n + 1
+        self.last = code
+
+    def clear(self):
+        """This empties the history, keeping its preallocated array"""
+        self.length = 0
+
+    @property
+    def lastFirst(self):
+        return Strategy.moveLetters[self.last >> 1]
+
+    @property
+    def lastSecond(self):
+        return Strategy.moveLetters[self.last & 1]
+
+    def count_first(self, move, pastrounds):
+        """This counts how many times move was the first move in the last pastrounds rounds"""
+        start = max(self.length - pastrounds, 0)
+        code = Strategy.moveCodes[move] << 1
+        return self.codes.count(code, start, self.length) + self.codes.count(code + 1, start, self.length)
+
+    def count_second(self, move, pastrounds):
+        """This counts how many times move was the second move in the last pastrounds rounds"""
+        start = max(self.length - pastrounds, 0)
+        code = Strategy.moveCodes[move]
+        return self.codes.count(code, start, self.length) + self.codes.count(code + 2, start, self.length)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [allRounds[code] for code in self.codes[:self.length][index]]
+        if index < 0:
+            index += self.length
+        if 0 <= index < self.length:
+            return allRounds[self.codes[index]]
+        raise IndexError("History index out of range")
+
+    def __iter__(self):
+        for code in self.codes[:self.length]:
+            yield allRounds[code]
+
+    def __eq__(self, other):
+        if isinstance(other, History):
+            return self.codes[:self.length] == other.codes[:other.length]
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "History({})".format(list(self))
+
+
+class WindowHistory(History):
+    """WindowHistory class - a History that only keeps its last rounds, in a ring of window round codes.
+    len() is still the number of rounds played, but only the last window rounds can be read.
+
+    >>> h = WindowHistory(window=2)
+    >>> for round in [('C', 'D'), ('D', 'D'), ('D', 'C')]:
+    ...     h.append(round)
+    >>> len(h)
+    3
+    >>> list(h)
+    [('D', 'D'), ('D', 'C')]
+    >>> h.count_second('D', 2)
+    1
+    >>> h[0]
+    Traceback (most recent call last):
+    IndexError: Only the last 2 rounds of the history are kept
+    """
+
+    def __init__(self, window=1):
+        super().__init__(window)
+
+    def append_code(self, code):
+        """This adds one round, given as a round code, overwriting the oldest round once the window is full"""
+        self.codes[self.length % self.size] = code
+        self.length += 1
+        self.last = code
+
+    def recent(self, pastrounds):
+        """This returns the round codes of the last pastrounds rounds, oldest first"""
+        if pastrounds > self.size and self.length > self.size:
+            raise IndexError("Only the last {} rounds of the history are kept".format(self.size))
+        kept = min(pastrounds, self.length)
+        end = self.length % self.size if self.length >= self.size else self.length
+        start = end - kept
+        if start >= 0:
+            return self.codes[start:end]
+        return self.codes[start:] + self.codes[:end]
+
+    def count_first(self, move, pastrounds):
+        """This counts how many times move was the first move in the last pastrounds rounds"""
+        code = Strategy.moveCodes[move] << 1
+        recent = self.recent(pastrounds)
+        return recent.count(code) + recent.count(code + 1)
+
+    def count_second(self, move, pastrounds):
+        """This counts how many times move was the second move in the last pastrounds rounds"""
+        code = Strategy.moveCodes[move]
+        recent = self.recent(pastrounds)
+        return recent.count(code) + recent.count(code + 2)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("History index out of range")
+        if index < self.length - self.size:
+            raise IndexError("Only the last {} rounds of the history are kept".format(self.size))
+        return allRounds[self.codes[index % self.size]]
+
+    def __iter__(self):
+        for code in self.recent(min(self.length, self.size)):
+            yield allRounds[code]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
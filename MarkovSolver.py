@@ -0,0 +1,328 @@
+import functools
+import zlib
+
+import numpy as np
+
+import Game
+import Player
+import StateMachine
+import Strategy
+
+# largest number of (state, state, noise level, score difference) cells a chain may have, about 400MB of floats each
+# for the chances before and after a round
+maxCells = 50000000
+
+
+class NoiseChain:
+    """NoiseChain class - the reactive noise of a game as a Markov chain over a grid of noise levels.
+    The noise increment drawn each round (uniform between 0 and noise_growthMax) is integrated at a few evenly spaced
+    points, and each point's new noise level is shared between its two nearest grid levels.
+    Flips are decided by the new noise level at each point, before it is put on the grid, as in Game.play_round.
+
+    >>> chain = NoiseChain(noise_growthMax=0.01, noiseMax=0.5, levels=51)
+    >>> chain.levels[:3].tolist()
+    [0.0, 0.01, 0.02]
+    >>> round(float(chain.start.sum()), 12), round(float(chain.start @ chain.levels), 12)
+    (1.0, 0.25)
+    >>> round(float(sum(weights.sum() for flips in [(0, 0), (0, 1), (1, 0), (1, 1)]
+    ...                 for offset, weights in chain.bands[(1, *flips)])), 12)
+    51.0
+    """
+
+    def __init__(self, noise_growthMax=0.01, noiseMax=0.5, levels=51, points=8):
+        """
+        :param noise_growthMax: max noise increment
+        :param noiseMax: max noise per game
+        :param levels: number of noise levels in the grid
+        :param points: number of points the noise increment is integrated at
+        """
+        # the starting noise is drawn between 0 and .5 whatever the max (see Game.set_noise), so the grid covers both
+        top = max(noiseMax, 0.5)
+        self.levels = np.linspace(0, top, levels)
+        self.step = top / (levels - 1)
+        self.noiseMax = noiseMax
+        increments = (np.arange(points) + 0.5) / points * noise_growthMax
+
+        # the starting noise, integrated at evenly spaced points between 0 and .5
+        self.start = np.zeros(levels)
+        self._spread(self.start, np.zeros(1, dtype=int), ((np.arange(levels * 4) + 0.5) / (levels * 4) * 0.5)[None, :],
+                     np.full((1, levels * 4), 1 / (levels * 4)))
+
+        # bands[(direction, flip1, flip2)]: the transition from each noise level to the next, as (offset, weights)
+        # diagonals, for a noise direction (-1 both cooperate, 1 one defects, 2 both defect) and the two players' flips
+        self.bands = {}
+        for direction in (-1, 1, 2):
+            noise = np.clip(self.levels[:, None] + direction * increments[None, :], 0, noiseMax)
+            for flip1 in (0, 1):
+                for flip2 in (0, 1):
+                    chance = (noise if flip1 else 1 - noise) * (noise if flip2 else 1 - noise) / points
+                    matrix = np.zeros((levels, levels))
+                    self._spread(matrix, np.arange(levels), noise, chance)
+                    self.bands[(direction, flip1, flip2)] = [(offset, np.diagonal(matrix, offset).copy())
+                                                             for offset in range(1 - levels, levels)
+                                                             if np.diagonal(matrix, offset).any()]
+
+    def _spread(self, out, rows, noise, weights):
+        # share each weight between the two grid levels nearest its noise level, keeping the mean noise level
+        position = noise / self.step
+        low = np.minimum(np.floor(position).astype(int), len(self.levels) - 2)
+        high = position - low
+        rows = np.broadcast_to(rows[:, None], noise.shape)
+        if out.ndim == 1:
+            np.add.at(out, low, weights * (1 - high))
+            np.add.at(out, low + 1, weights * high)
+        else:
+            np.add.at(out, (rows, low), weights * (1 - high))
+            np.add.at(out, (rows, low + 1), weights * high)
+
+
+def solve_game(strategy1: Strategy, strategy2: Strategy, rounds=100, noise_growthMax=0.01, noiseMax=0.5, mode='I',
+               payoffs=(5, 3, 1, 0), outcomes=True, levels=51):
+    """
+    Expected scores and win/tie probabilities of a game between two strategies, worked out from the game as a Markov
+    chain over (state of each player's compiled strategy, noise level, score difference) instead of by sampling.
+    The noise level is kept on a grid (see NoiseChain), everything else is exact. Random moves are 50/50.
+    Solutions are cached by their arguments.
+    :param strategy1: strategy class of player 1 (with a finite-state machine form, see StateMachine)
+    :param strategy2: strategy class of player 2
+    :param rounds: number of rounds in the game
+    :param noise_growthMax: max noise increment
+    :param noiseMax: max noise per game
+    :param mode: game mode, misimplementation (I) or misperception (P)
+    :param payoffs: (T, R, P, S) payoffs of the game
+    :param outcomes: also work out the win/tie probabilities, which needs the score difference in the chain.
+                     Without them, pairs of strategies with many states (SM, HM, GRAD) solve much faster.
+    :param levels: number of noise levels in the grid
+    :return: a dict with p1Score and p2Score (expected total scores) and, with outcomes, p1Win, p2Win and tie
+
+    >>> s = solve_game(Strategy.TitForTat, Strategy.AlwaysDefect, noiseMax=0)
+    >>> s['p1Score'], s['p2Score'], s['p2Win']
+    (99.0, 104.0, 1.0)
+    >>> s = solve_game(Strategy.TitForTat, Strategy.TitForTat)
+    >>> round(s['p1Score'], 1), round(s['p1Win'] + s['p2Win'] + s['tie'], 6)
+    (238.3, 1.0)
+
+    A pair of strategies is solved once, in one order, the other order is the same solution seen from player 2:
+
+    >>> s = solve_game(Strategy.TitForTat, Strategy.AlwaysDefect)
+    >>> solve_game(Strategy.AlwaysDefect, Strategy.TitForTat) == swapped(s)
+    True
+    """
+    if _order(strategy1) > _order(strategy2):
+        return swapped(solve_game(strategy2, strategy1, rounds, noise_growthMax, noiseMax, mode, payoffs, outcomes,
+                                  levels))
+    return dict(_solve(strategy1, strategy2, rounds, noise_growthMax, noiseMax, mode, tuple(payoffs), outcomes,
+                       levels))
+
+
+def _order(strategy):
+    # the order the two strategies of a pair are solved in
+    return strategy.__qualname__
+
+
+def swapped(solution: dict):
+    """This returns the solution of a game seen from player 2, as the solution of the game with the players swapped"""
+    names = {'p1Score': 'p2Score', 'p2Score': 'p1Score', 'p1Win': 'p2Win', 'p2Win': 'p1Win', 'tie': 'tie'}
+    return {names[stat]: value for stat, value in solution.items()}
+
+
+def state_cells(strategy1: Strategy, strategy2: Strategy, rounds=100, outcomes=True, levels=51):
+    """
+    The number of (state, state, noise level, score difference) cells in the chain of a game, which solve_game can
+    only work out up to maxCells. Strategies are compiled, but nothing is solved
+    """
+    n1 = len(StateMachine.compile_strategy(strategy1, rounds).states)
+    n2 = len(StateMachine.compile_strategy(strategy2, rounds).states)
+    return n1 * n2 * levels * (2 * rounds + 1 if outcomes else 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _solve(strategy1, strategy2, rounds, noise_growthMax, noiseMax, mode, payoffs, outcomes, levels):
+    T, R, P, S = payoffs
+    table = [[R, S], [T, P]]
+    implementNoise = mode in ['misimplementation', 'I', 'i']
+    if state_cells(strategy1, strategy2, rounds, outcomes, levels) > maxCells:
+        raise Exception("{} vs {} has too many states to solve with outcomes, use outcomes=False."
+                        .format(strategy1().id, strategy2().id))
+    chain = NoiseChain(noise_growthMax, noiseMax, levels)
+    m1 = StateMachine.compile_strategy(strategy1, rounds)
+    m2 = StateMachine.compile_strategy(strategy2, rounds)
+    n1, n2, K = len(m1.states), len(m2.states), len(chain.levels)
+    width = 2 * rounds + 1 if outcomes else 1
+    offset = rounds if outcomes else 0
+
+    # chance of each move in each state: 1 for the machine's move, .5 each for a random move
+    moves1 = np.stack([(m1.moves == move) + 0.5 * (m1.moves == StateMachine.randomMove) for move in (0, 1)], axis=1)
+    moves2 = np.stack([(m2.moves == move) + 0.5 * (m2.moves == StateMachine.randomMove) for move in (0, 1)], axis=1)
+
+    # probability of every (player 1 state, player 2 state, noise level, score difference) before each round.
+    # The score difference counts rounds won by player 1 minus rounds won by player 2, offset by rounds
+    chances = np.zeros((n1, n2, K, width))
+    chances[0, 0, :, offset] = chain.start
+
+    p1Score = p2Score = 0.0
+    for r in range(rounds):
+        # only the states that hold some probability, and the score differences reachable in r rounds, are worked on
+        held = chances.any(axis=(2, 3))
+        held1, held2 = held.any(axis=1), held.any(axis=0)
+        low, high = (offset - r, offset + r + 1) if outcomes else (0, 1)
+        after = np.zeros((n1 * n2, K, width))
+        for move1 in (0, 1):
+            states1 = np.flatnonzero(moves1[:, move1] * held1)
+            for move2 in (0, 1):
+                states2 = np.flatnonzero(moves2[:, move2] * held2)
+                if not len(states1) or not len(states2):
+                    continue
+                played = chances[np.ix_(states1, states2)][..., low:high] * (
+                    moves1[states1, move1][:, None, None, None] * moves2[states2, move2][None, :, None, None])
+                direction = -1 if move1 + move2 == 0 else move1 + move2
+                for flip1 in (0, 1):
+                    for flip2 in (0, 1):
+                        moved = np.zeros_like(played)
+                        for shift, weights in chain.bands[(direction, flip1, flip2)]:
+                            if shift >= 0:
+                                moved[:, :, shift:] += played[:, :, :K - shift] * weights[:, None]
+                            else:
+                                moved[:, :, :K + shift] += played[:, :, -shift:] * weights[:, None]
+
+                        # score the round on the noisy or the real moves, depending on the game mode
+                        seen1, seen2 = move1 ^ flip1, move2 ^ flip2
+                        scored1, scored2 = (seen1, seen2) if implementNoise else (move1, move2)
+                        mass = moved.sum()
+                        p1Score += mass * table[scored1][scored2]
+                        p2Score += mass * table[scored2][scored1]
+                        won = int(np.sign(table[scored1][scored2] - table[scored2][scored1])) if outcomes else 0
+
+                        # each player perceives its own real move and its opponent's noisy move
+                        next1 = m1.transitions[states1, 2 * move1 + seen2]
+                        next2 = m2.transitions[states2, 2 * move2 + seen1]
+                        joint = (next1[:, None] * n2 + next2[None, :]).ravel()
+                        np.add.at(after[:, :, low + won:high + won], joint, moved.reshape(-1, K, high - low))
+        chances = after.reshape(n1, n2, K, width)
+
+    solution = {'p1Score': float(p1Score), 'p2Score': float(p2Score)}
+    if outcomes:
+        difference = chances.sum(axis=(0, 1, 2))
+        solution['p1Win'] = float(difference[offset + 1:].sum())
+        solution['p2Win'] = float(difference[:offset].sum())
+        solution['tie'] = float(difference[offset])
+    return tuple(solution.items())
+
+
+def simulate_game(strategy1: Strategy, strategy2: Strategy, rounds=100, noise_growthMax=0.01, noiseMax=0.5, mode='I',
+                  payoffs=(5, 3, 1, 0), games=1000, seed=0):
+    """
+    Estimates of what solve_game works out, from games played with the game engine, for pairs of strategies
+    with too many states to solve (see state_cells). Each pair of strategies gets its own seeds from seed
+    :param games: number of games played
+    :param seed: master seed of the games
+    :return: a dict with mean p1Score and p2Score and the share of games p1Win, p2Win and tie, as solve_game
+
+    >>> s = simulate_game(Strategy.TitForTat, Strategy.AlwaysDefect, noiseMax=0, games=10)
+    >>> s['p1Score'], s['p2Score'], s['p2Win']
+    (99.0, 104.0, 1.0)
+    """
+    pair = '{} {}'.format(strategy1.__qualname__, strategy2.__qualname__)
+    seeds = np.random.SeedSequence(seed, spawn_key=(zlib.crc32(pair.encode()),)).spawn(games)
+    p1, p2 = Player.Player(strategy1), Player.Player(strategy2)
+    game = None
+    p1Scores = np.zeros(games)
+    p2Scores = np.zeros(games)
+    for k, gameSeed in enumerate(seeds):
+        # one game is made, then reset for each game
+        if game is None:
+            game = Game.Game(p1, p2, rounds, noise_growthMax, noiseMax, seed=gameSeed, retain='scores')
+            game.implementNoise = game.set_mode(mode)
+            game.payoffs = game.set_payoffs(*payoffs)
+        else:
+            game.reset(p1, p2, gameSeed)
+        game.play_game()
+        p1Scores[k], p2Scores[k] = game.p1Score, game.p2Score
+    return {'p1Score': float(p1Scores.mean()), 'p2Score': float(p2Scores.mean()),
+            'p1Win': float((p1Scores > p2Scores).mean()), 'p2Win': float((p1Scores < p2Scores).mean()),
+            'tie': float((p1Scores == p2Scores).mean())}
+
+
+def solve_tournament(players, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode='I', payoffs=(5, 3, 1, 0),
+                     outcomes=True, simulate=1000, seed=0):
+    """
+    Expected stats of every player in a tournament, the analytical counterpart of Tournament.play_tournament:
+    each player's expected score per round and win/loss/tie rates, averaged over its games.
+    Each pair of strategies is only solved once, in one order (see solve_game). The size of every pair is checked
+    before any is solved: pairs with more than maxCells states are estimated from simulate games each instead
+    (see simulate_game), or if simulate is 0, the tournament isn't solved.
+    :param players: a dictionary of form {'playername': playerObject}
+    :param outcomes: also work out win/loss/tie rates, see solve_game. Without them, the rates are left out
+    :param simulate: number of games played for each pair of strategies too large to solve
+    :param seed: master seed of the games played
+    :return: a list of all players, each player has a dict with id and stats, like play_tournament
+
+    >>> import Tournament
+    >>> players = Tournament.create_playerlist({Strategy.TitForTat: 2, Strategy.AlwaysDefect: 2})
+    >>> expected = solve_tournament(players, noisemax=0)
+    >>> [(p['strategy'], round(p['scoreAvg'], 4), round(p['winRate'], 4)) for p in expected]
+    [('TFT', 1.66, 0.0), ('TFT', 1.66, 0.0), ('AllD', 1.0267, 0.6667), ('AllD', 1.0267, 0.6667)]
+
+    The expected scores agree with the mean scores of a monte carlo run, within its sampling error:
+
+    >>> players = Tournament.create_playerlist({Strategy.TitForTat: 1, Strategy.Pavlov: 1, Strategy.AlwaysDefect: 1,
+    ...                                         Strategy.Random: 1, Strategy.TitForTwoTats: 1})
+    >>> expected = {p['strategy']: p['scoreAvg'] for p in solve_tournament(players)}
+    >>> simulated = Tournament.run_MCsim(players, times=500, seed=1).groupby('PlayerStrategy')['PlayerScore'].mean()
+    >>> max(abs(expected[strategy] - score) for strategy, score in simulated.items()) < 0.02
+    True
+
+    Pairs too large to solve are simulated:
+
+    >>> import MarkovSolver
+    >>> limit, MarkovSolver.maxCells = MarkovSolver.maxCells, 40000
+    >>> solve_tournament(players, simulate=0)
+    Traceback (most recent call last):
+    Exception: Too many states to solve TFT vs PAV, TFT vs TFTT, PAV vs TFTT, use outcomes=False or simulate.
+    >>> estimated = {p['strategy']: p['scoreAvg'] for p in solve_tournament(players, simulate=500)}
+    >>> MarkovSolver.maxCells = limit
+    >>> max(abs(expected[strategy] - estimated[strategy]) for strategy in expected) < 0.05
+    True
+    """
+    count = {}
+    for player in players.values():
+        count[type(player.strategy)] = count.get(type(player.strategy), 0) + 1
+    strategies = list(count)
+
+    # pairs of strategies that play each other, a strategy only plays itself with two players or more
+    pairs = [(a, b) for k, a in enumerate(strategies) for b in strategies[k:] if a is not b or count[a] > 1]
+    tooLarge = [(a, b) for a, b in pairs if state_cells(a, b, numrounds, outcomes) > maxCells]
+    if tooLarge and not simulate:
+        raise Exception("Too many states to solve {}, use outcomes=False or simulate."
+                        .format(', '.join('{} vs {}'.format(a().id, b().id) for a, b in tooLarge)))
+
+    solutions = {}
+    for a, b in pairs:
+        if (a, b) in tooLarge:
+            solution = simulate_game(a, b, numrounds, noisegrowth, noisemax, mode, payoffs, simulate, seed)
+        else:
+            solution = solve_game(a, b, numrounds, noisegrowth, noisemax, mode, payoffs, outcomes)
+        solutions[(a, b)] = solution
+        solutions[(b, a)] = swapped(solution)
+
+    numgames = len(players) - 1
+    allplayers = []
+    for player in players.values():
+        stats = {'points': 0.0, 'wins': 0.0, 'losses': 0.0, 'ties': 0.0}
+        for other in players.values():
+            if other is player:
+                continue
+            s = solutions[(type(player.strategy), type(other.strategy))]
+            stats['points'] += s['p1Score'] / numrounds
+            if outcomes:
+                stats['wins'] += s['p1Win']
+                stats['losses'] += s['p2Win']
+                stats['ties'] += s['tie']
+
+        playerdict = {'id': player.name, 'strategy': player.strategy.id, 'scoreAvg': stats['points'] / numgames}
+        if outcomes:
+            playerdict['winRate'] = stats['wins'] / numgames
+            playerdict['lossRate'] = stats['losses'] / numgames
+            playerdict['tieRate'] = stats['ties'] / numgames
+        allplayers.append(playerdict)
+    return allplayers
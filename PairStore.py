@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+import Game
+import History
+import Player
+
+# modules whose code decides every game's result, a change to any of them (or to this module) makes every stored
+# game stale. A change to one strategy only makes the games of that strategy stale, see strategy_version
+engineModules = [Game, History, Player]
+
+
+class PairStore:
+    """PairStore class - a persistent store of the results of single games, so tournaments only play the games
+    they have never played before. A tournament played with a store (see Tournament.play_tournament) seeds each
+    game from who plays it rather than from its place in the tournament: each player is known by its strategy
+    and how many players of that strategy come before it ('TFT#0', 'TFT#1', ...), so adding players leaves the
+    games between the others, and their seeds, as they were.
+    Games are stored by the tournament seed, the game settings, both players and the version of both strategies
+    and of the game engine, in an sqlite database that several processes can share. Only seeded tournaments can be
+    played with a store.
+
+    >>> import tempfile, Strategy, Tournament
+    >>> store = PairStore(os.path.join(tempfile.mkdtemp(), 'pairs.sqlite'))
+    >>> players = Tournament.create_playerlist({Strategy.TitForTat: 2, Strategy.Random: 2})
+    >>> t = Tournament.play_tournament(players, seed=1, pairStore=store)
+    >>> store.count()
+    6
+
+    Adding a player of a new strategy only plays its games against the others:
+
+    >>> players.update(Tournament.create_playerlist({Strategy.Pavlov: 1}))
+    >>> t = Tournament.play_tournament(players, seed=1, pairStore=store)
+    >>> store.count()
+    10
+    >>> fresh = PairStore(os.path.join(tempfile.mkdtemp(), 'pairs.sqlite'))
+    >>> t == Tournament.play_tournament(players, seed=1, pairStore=fresh)
+    True
+
+    Games of unseeded tournaments could never be looked up again, so they aren't played with a store:
+
+    >>> Tournament.play_tournament(players, pairStore=store)
+    Traceback (most recent call last):
+    Exception: A pair store needs a seed, the games of an unseeded tournament are never played again.
+    """
+
+    def __init__(self, path='Results/pairs.sqlite'):
+        """
+        :param path: sqlite file of the store, created if it doesn't exist
+        """
+        self.path = path
+        self.version = engine_version()
+        self._connection = None
+
+    def __getstate__(self):
+        # a store sent to a worker process opens its own connection there
+        return {'path': self.path, 'version': self.version, '_connection': None}
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            import sqlite3
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS games (settings TEXT, seed TEXT, p1 TEXT, p2 TEXT, '
+                                     'p1Score REAL, p2Score REAL, PRIMARY KEY (settings, seed, p1, p2)) WITHOUT ROWID')
+        return self._connection
+
+    def keys(self, settings: dict, seed: np.random.SeedSequence):
+        """This returns the settings and seed of a tournament as the text they are stored under"""
+        gameSettings = [settings[setting] for setting in ['numrounds', 'noisegrowth', 'noisemax', 'mode', 'payoffs']]
+        settingsKey = json.dumps(gameSettings + [self.version])
+        seedKey = json.dumps([seed.entropy, list(seed.spawn_key), seed.pool_size])
+        return settingsKey, seedKey
+
+    def games(self, settings: dict, seed: np.random.SeedSequence):
+        """
+        The games stored for a tournament
+        :return: a dictionary of form {(p1 identity, p2 identity): (p1Score, p2Score)}
+        """
+        rows = self.connection.execute('SELECT p1, p2, p1Score, p2Score FROM games WHERE settings = ? AND seed = ?',
+                                       self.keys(settings, seed))
+        return {(p1, p2): (p1Score, p2Score) for p1, p2, p1Score, p2Score in rows}
+
+    def add(self, settings: dict, seed: np.random.SeedSequence, games: list):
+        """
+        Store the games of a tournament
+        :param games: list of (p1 identity, p2 identity, p1Score, p2Score)
+        """
+        settingsKey, seedKey = self.keys(settings, seed)
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?)',
+                                        [(settingsKey, seedKey) + tuple(game) for game in games])
+
+    def count(self):
+        """This returns the number of games stored"""
+        return self.connection.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def identities(players: list):
+    """
+    The name each player is known by in a store: its strategy id and how many players of that strategy
+    come before it, followed by the version of the strategy
+
+    >>> import Strategy
+    >>> players = [Player.Player(Strategy.TitForTat), Player.Player(Strategy.Random),
+    ...            Player.Player(Strategy.TitForTat)]
+    >>> [identity.split('@')[0] for identity in identities(players)]
+    ['TFT#0', 'RAND#0', 'TFT#1']
+    """
+    seen = {}
+    names = []
+    for player in players:
+        strategy = player.strategy.id
+        names.append('{}#{}@{}'.format(strategy, seen.get(strategy, 0), strategy_version(type(player.strategy))))
+        seen[strategy] = seen.get(strategy, 0) + 1
+    return names
+
+
+def game_seed(seed: np.random.SeedSequence, p1: str, p2: str):
+    """
+    The seed of the game between two players of a tournament, from the tournament seed and the players'
+    identities (without their versions), whatever the other players in the tournament
+
+    >>> seed = np.random.SeedSequence(1)
+    >>> a, b = game_seed(seed, 'TFT#0@a', 'RAND#0@b'), game_seed(seed, 'TFT#0@c', 'RAND#0@d')
+    >>> a.generate_state(2).tolist() == b.generate_state(2).tolist()
+    True
+    """
+    pair = ' '.join(identity.split('@')[0] for identity in (p1, p2))
+    pairKey = int(hashlib.sha1(pair.encode()).hexdigest()[:16], 16)
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (pairKey,), pool_size=seed.pool_size)
+
+
+@functools.lru_cache(maxsize=None)
+def strategy_version(strategy):
+    """A short hash of a strategy class's source code, so only the games of a strategy that changed go stale"""
+    return hashlib.sha1(inspect.getsource(strategy).encode()).hexdigest()[:8]
+
+
+def engine_version():
+    """A short hash of the source files of engineModules and of this module, which seeds the games"""
+    digest = hashlib.sha256()
+    for path in [module.__file__ for module in engineModules] + [__file__]:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
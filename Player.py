@@ -1,3 +1,4 @@
+import History
 import Strategy
 
 
@@ -16,9 +17,29 @@ class Player:
     True
     >>> p1.has_defected_for(1)
     True
+    >>> p1.history
+    History([('C', 'D')])
+    >>> p1.remember(History.roundCodes[('C', 'C')])
+    >>> p1.opponentDefections, p1.opponentStreak, p1.opponentEverDefected
+    (1, 0, True)
+    >>> p1.has_recently_defected(1), p1.has_recently_defected(2)
+    (False, True)
+
+    Strategies keep their counts and countdowns in the player's state object, not on the player:
+
+    >>> p2 = Player(strategy=Strategy.Gradual)
+    >>> p2.state.defectionCount
+    0
+    >>> p2.movesCountdown = 1
+    Traceback (most recent call last):
+    AttributeError: 'Player' object has no attribute 'movesCountdown'
     """
     playerCount = 0
 
+    # players are made by the thousand for every monte carlo run, so they keep their attributes in slots
+    __slots__ = ('strategy', 'name', 'wins', 'losses', 'ties', 'points', '_history', 'randomMoves', 'state',
+                 'opponentDefections', 'opponentStreak', 'opponentEverDefected', 'lastOpponentDefection')
+
     def __init__(self, strategy: Strategy, name=None):
 
         self.strategy = strategy()
@@ -30,46 +51,77 @@ class Player:
             self.name = name
 
         # Tournament-level stats
+        self.reset()
+
+        # Game-level stats, the running opponent statistics are kept up to date by remember()
+        self.history = History.History()
+        self.randomMoves = []  # drawn by the game, used by Strategy.Random
+
+        # Counts and countdowns for use by Strategy's next_move() function, see Strategy.State
+        self.state = self.strategy.new_state()
+
+
+    def reset(self):
+        """This clears the player's tournament-level stats, so the player can play the next tournament"""
         self.wins = 0
         self.losses = 0
         self.ties = 0
         self.points = 0
 
-        # Game-level stats
-        self.history = []
 
-        # Stats for use by Strategy's next_move() function
-        self.defectionCountdown = 0
-        self.cooperationCountdown = 0
-        self.defectionCount = 0
-        self.cooperationCount = 0
+    @property
+    def history(self):
+        """The player's perceived moves in the current game, as (my move, their move) rounds"""
+        return self._history
+
+
+    @history.setter
+    def history(self, moves):
+        # start the running opponent statistics over
+        self.opponentDefections = 0  # total defections of the opponent
+        self.opponentStreak = 0  # consecutive defections of the opponent, up to the last round
+        self.opponentEverDefected = False
+        self.lastOpponentDefection = -1  # round of the opponent's last defection
+
+        # keep the compact History type, whatever sequence of rounds is assigned
+        if isinstance(moves, History.History) and not moves:
+            self._history = moves
+        else:
+            self._history = History.History(len(moves))
+            for round in moves:
+                self.remember(History.roundCodes[round])
+
+
+    def remember(self, code):
+        """Adds a perceived round (a History round code) to the player's history,
+        and updates the running opponent statistics so strategies can query them in constant time."""
+        history = self._history
+        n = history.length
+        if code & 1:
+            self.opponentDefections += 1
+            self.opponentStreak += 1
+            self.opponentEverDefected = True
+            self.lastOpponentDefection = n
+        else:
+            self.opponentStreak = 0
+        history.append_code(code)
 
 
     @property
     def myLastMove(self):
-        return self.history[-1][0]
+        return Strategy.moveLetters[self._history.last >> 1]
 
 
     @property
     def theirLastMove(self):
-        return self.history[-1][1]
+        return Strategy.moveLetters[self._history.last & 1]
 
 
     def has_recently_defected(self, pastrounds):
-        for round in self.history[-pastrounds:]:
-            if round[1] == 'D':
-                return True
-        return False
+        return self.opponentEverDefected and self.lastOpponentDefection >= self._history.length - pastrounds
 
 
     def has_defected_for(self, pastrounds):
-        roundcount = 0
-        for round in self.history[-pastrounds:]:
-            if round[1] == 'D':
-                roundcount += 1
-        if roundcount == pastrounds:
-            return True
-        else:
-            return False
+        return self.opponentStreak >= pastrounds
 
 
@@ -0,0 +1,132 @@
+import contextlib
+import functools
+import time
+
+import pandas as pd
+
+import Game
+import Strategy
+
+# original methods replaced by timed ones while profiling is enabled, by (class, method name)
+_originals = {}
+
+# seconds spent in each timed method, and calls and seconds of next_move per strategy id
+_methodSeconds = {'play_round': 0.0, 'send_history': 0.0}
+_strategyCalls = {}
+_strategySeconds = {}
+
+
+def enable():
+    """
+    Start profiling games played with the game engine, in this process.
+    Game.play_round, Game.send_history and the next_move method of every strategy are replaced by timed versions.
+    disable() puts the originals back, so profiling costs nothing while it is off.
+    """
+    if _originals:
+        return
+    _patch(Game.Game, 'play_round', _timed_method)
+    _patch(Game.Game, 'send_history', _timed_method)
+    for strategy in _strategy_classes(Strategy.Strategy):
+        if 'next_move' in vars(strategy):
+            _patch(strategy, 'next_move', _timed_move)
+
+
+def disable():
+    """Stop profiling and put the original methods back, keeping the timings gathered so far"""
+    for (owner, name), method in _originals.items():
+        setattr(owner, name, method)
+    _originals.clear()
+
+
+def reset():
+    """This clears the timings gathered so far"""
+    for name in _methodSeconds:
+        _methodSeconds[name] = 0.0
+    _strategyCalls.clear()
+    _strategySeconds.clear()
+
+
+@contextlib.contextmanager
+def profiling():
+    """
+    Profile the games played inside a with block, starting from cleared timings
+
+    >>> import Tournament
+    >>> players = Tournament.create_playerlist({Strategy.TitForTat: 2, Strategy.Gradual: 2})
+    >>> with profiling():
+    ...     t = Tournament.play_tournament(players, seed=1)
+    >>> sorted(strategy_report()['Calls'].items())
+    [('GRAD', 600), ('TFT', 600)]
+    >>> phase_report().index.tolist()
+    ['strategy dispatch', 'noise and scoring', 'history']
+    >>> hasattr(Game.Game.play_round, '__wrapped__'), hasattr(Strategy.Gradual.next_move, '__wrapped__')
+    (False, False)
+    """
+    reset()
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def phase_report():
+    """
+    Time spent in each phase of the rounds played while profiling:
+    strategy dispatch (next_move), noise and scoring (the rest of play_round) and history (send_history)
+    :return: a pandas dataframe indexed by phase, with Seconds and Share of the total
+    """
+    dispatch = sum(_strategySeconds.values())
+    phases = {'strategy dispatch': dispatch,
+              'noise and scoring': _methodSeconds['play_round'] - dispatch,
+              'history': _methodSeconds['send_history']}
+    report = pd.DataFrame({'Seconds': list(phases.values())}, index=pd.Index(list(phases), name='Phase'))
+    report['Share'] = report['Seconds'] / max(report['Seconds'].sum(), 1e-12)
+    return report
+
+
+def strategy_report():
+    """
+    Calls and time spent in next_move per strategy while profiling, the hot spots first
+    :return: a pandas dataframe indexed by strategy id, with Calls, Seconds, MeanMicroseconds per call
+             and Share of all strategy dispatch time
+    """
+    strategies = list(_strategyCalls)
+    report = pd.DataFrame({'Calls': [_strategyCalls[s] for s in strategies],
+                           'Seconds': [_strategySeconds[s] for s in strategies]},
+                          index=pd.Index(strategies, name='PlayerStrategy'))
+    report['MeanMicroseconds'] = report['Seconds'] / report['Calls'] * 1e6
+    report['Share'] = report['Seconds'] / max(report['Seconds'].sum(), 1e-12)
+    return report.sort_values('Seconds', ascending=False, kind='stable')
+
+
+def _patch(owner, name, timer):
+    _originals[(owner, name)] = vars(owner)[name]
+    setattr(owner, name, timer(name, vars(owner)[name]))
+
+
+def _strategy_classes(base):
+    for subclass in base.__subclasses__():
+        yield subclass
+        yield from _strategy_classes(subclass)
+
+
+def _timed_method(name, method):
+    @functools.wraps(method)
+    def timed(self):
+        start = time.perf_counter()
+        method(self)
+        _methodSeconds[name] += time.perf_counter() - start
+    return timed
+
+
+def _timed_move(name, next_move):
+    @functools.wraps(next_move)
+    def timed(self, player):
+        start = time.perf_counter()
+        move = next_move(self, player)
+        elapsed = time.perf_counter() - start
+        _strategyCalls[self.id] = _strategyCalls.get(self.id, 0) + 1
+        _strategySeconds[self.id] = _strategySeconds.get(self.id, 0.0) + elapsed
+        return move
+    return timed
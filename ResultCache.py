@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+
+import BatchGame
+import Game
+import History
+import OutcomeCache
+import PairStore
+import Player
+import StateMachine
+import Strategy
+
+# modules whose code decides the results of a run, a change to any of them starts a new version of the cache.
+# Tournament is added when the version is worked out, so importing this module doesn't import it
+sourceModules = [Strategy, Game, BatchGame, StateMachine, OutcomeCache, Player, History, PairStore]
+
+# names of the version folders of a cache, see code_version
+versionPattern = re.compile('[0-9a-f]{16}')
+
+
+class ResultCache:
+    """ResultCache class - an on-disk cache of the results of seeded tournaments and monte carlo runs.
+    Each result is stored in its own file, named by a hash of what decides it: the strategy of every player
+    (in order), the settings of the run, its seed and the version of the code. The version is a hash of the
+    source files in sourceModules, so results go stale as soon as the game or a strategy changes, and stale
+    results are deleted when the cache is opened.
+    The cache is bounded in size: once it grows past maxBytes, the least recently used results are evicted.
+    Several processes can share a cache, results are written to a temporary file and moved into place.
+
+    >>> import tempfile, pandas as pd
+    >>> cache = ResultCache(os.path.join(tempfile.mkdtemp(), 'cache'), maxBytes=10**6)
+    >>> players = {'P1': Player.Player(Strategy.TitForTat), 'P2': Player.Player(Strategy.Random)}
+    >>> cache.get('run', players, {'times': 2}, seed=1) is None
+    True
+    >>> frame = pd.DataFrame({'TournamentID': [1, 1], 'PlayerID': ['P1', 'P2'], 'PlayerScore': [2.5, 3.0]})
+    >>> cache.put('run', players, {'times': 2}, 1, frame)
+    >>> cache.get('run', players, {'times': 2}, seed=1)['PlayerScore'].tolist()
+    [2.5, 3.0]
+
+    Results are read back with the ids of the players asked for, as player names change from run to run:
+
+    >>> others = {'P7': Player.Player(Strategy.TitForTat), 'P8': Player.Player(Strategy.Random)}
+    >>> cache.get('run', others, {'times': 2}, seed=1)['PlayerID'].tolist()
+    ['P7', 'P8']
+    >>> cache.get('run', players, {'times': 3}, seed=1) is None
+    True
+
+    Past maxBytes, the results read or written longest ago go first:
+
+    >>> cache.maxBytes = cache.size() * 2
+    >>> cache.put('run', players, {'times': 3}, 1, frame)
+    >>> cache.get('run', players, {'times': 2}, seed=1) is None
+    False
+    >>> cache.put('run', players, {'times': 4}, 1, frame)
+    >>> [cache.get('run', players, {'times': times}, seed=1) is None for times in (2, 3, 4)]
+    [False, True, False]
+
+    Opening a cache removes the folders of other versions of the code, and nothing else:
+
+    >>> root = tempfile.mkdtemp()
+    >>> for folder in ['0123456789abcdef', 'notes']:
+    ...     os.makedirs(os.path.join(root, folder))
+    >>> sorted(os.listdir(ResultCache(root).path)) == sorted([code_version(), 'notes'])
+    True
+    """
+
+    def __init__(self, path='Results/cache', maxBytes=2 ** 30):
+        """
+        :param path: folder of the cache, created if it doesn't exist
+        :param maxBytes: largest total size of the results kept, in bytes
+        """
+        self.path = path
+        self.maxBytes = maxBytes
+        self.version = code_version()
+        self.folder = os.path.join(path, self.version)
+        os.makedirs(self.folder, exist_ok=True)
+
+        # results of other versions of the code can never be hit again. Only version folders are removed,
+        # anything else in path is left as it is
+        for entry in os.scandir(path):
+            if entry.is_dir() and entry.name != self.version and versionPattern.fullmatch(entry.name):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def key(self, kind: str, players: dict, settings: dict, seed):
+        """
+        The hash a result is stored under
+        :param kind: what the result is, such as 'run' for run_MCsim or 'tournament' for play_tournament
+        :param players: a dictionary of form {'playername': playerObject}, only their strategies are part of the key
+        :param settings: every setting that decides the result, as a dictionary of json values
+        :param seed: seed of the run (int or numpy SeedSequence)
+        """
+        if isinstance(seed, np.random.SeedSequence):
+            # children already spawned are part of the seed, as the next ones spawned differ
+            seed = [seed.entropy, list(seed.spawn_key), seed.pool_size, seed.n_children_spawned]
+        described = {'kind': kind, 'strategies': [player.strategy.id for player in players.values()],
+                     'settings': settings, 'seed': seed, 'version': self.version}
+        return hashlib.sha256(json.dumps(described, sort_keys=True).encode()).hexdigest()
+
+    def get(self, kind: str, players: dict, settings: dict, seed, idColumn='PlayerID'):
+        """
+        Look up a result
+        :param idColumn: column of player names in the result, relabelled to the names of players
+        :return: the pandas dataframe stored, or None if the result isn't in the cache
+        """
+        import pandas as pd
+        path = self._path(self.key(kind, players, settings, seed))
+        try:
+            frame = pd.read_pickle(path)
+        except (FileNotFoundError, EOFError):
+            return None
+        # reading a result makes it the most recently used
+        _touch(path)
+        if idColumn in frame:
+            frame[idColumn] = np.tile(np.array(list(players), dtype=object), len(frame) // len(players))
+        return frame
+
+    def put(self, kind: str, players: dict, settings: dict, seed, frame):
+        """Store a result, a pandas dataframe, then evict the least recently used results past maxBytes"""
+        path = self._path(self.key(kind, players, settings, seed))
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        frame.to_pickle(temp)
+        os.replace(temp, path)
+        _touch(path)
+        self._evict()
+
+    def size(self):
+        """This returns the total size of the results in the cache, in bytes"""
+        return sum(entry.stat().st_size for entry in os.scandir(self.folder))
+
+    def clear(self):
+        """This deletes every result in the cache"""
+        for entry in os.scandir(self.folder):
+            os.remove(entry.path)
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + '.pkl')
+
+    def _evict(self):
+        entries = sorted(os.scandir(self.folder), key=lambda entry: entry.stat().st_mtime_ns)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.maxBytes:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _touch(path):
+    # files are stamped with the clock in nanoseconds, as the file system's own timestamps can be too coarse
+    # to tell apart results used in quick succession
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def code_version():
+    """
+    A short hash of the source files of sourceModules and Tournament, the version of the code that results come from
+    """
+    import Tournament
+    digest = hashlib.sha256()
+    for module in sourceModules + [Tournament]:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+
+class ResultWriter:
+    """ResultWriter class - streams monte carlo results to a csv file as tournaments finish.
+    Rows are flushed to disk every checkpoint tournaments, and a manifest next to the csv file records
+    the settings of the run, its seed and the last TournamentID written, so an interrupted run can resume.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'results.csv')
+    >>> w = ResultWriter(path, ['TournamentID', 'PlayerScore'], checkpoint=2)
+    >>> w.open({'times': 3}, seed=7)
+    (1, 7)
+    >>> w.write(1, [{'TournamentID': 1, 'PlayerScore': 2.5}])
+    >>> w.write(2, [{'TournamentID': 2, 'PlayerScore': 3.0}])
+    >>> w.write(3, [{'TournamentID': 3, 'PlayerScore': 1.0}])
+
+    The run is interrupted before tournament 3 is flushed, so it resumes from there:
+
+    >>> w = ResultWriter(path, ['TournamentID', 'PlayerScore'], checkpoint=2)
+    >>> w.open({'times': 3}, resume=True)
+    (3, 7)
+    >>> w.write(3, [{'TournamentID': 3, 'PlayerScore': 1.0}])
+    >>> w.close()
+    >>> print(open(path).read().strip())
+    TournamentID,PlayerScore
+    1,2.5
+    2,3.0
+    3,1.0
+    >>> w.open({'times': 4}, resume=True)
+    Traceback (most recent call last):
+    Exception: Cannot resume results.csv, it was written with different settings.
+
+    A run that ends before its last tournament records why, and resuming it carries on after the last one written:
+
+    >>> w = ResultWriter(path, ['TournamentID', 'PlayerScore'])
+    >>> w.open({'times': 3}, seed=7)
+    (1, 7)
+    >>> w.write(1, [{'TournamentID': 1, 'PlayerScore': 2.5}])
+    >>> w.close(stopped='precision')
+    >>> {key: w.manifest[key] for key in ['completed', 'finished', 'stopped']}
+    {'completed': 1, 'finished': True, 'stopped': 'precision'}
+    >>> w.open({'times': 3}, resume=True)
+    (2, 7)
+    """
+
+    def __init__(self, path: str, columns: list, checkpoint=100):
+        self.path = path
+        self.manifestPath = os.path.splitext(path)[0] + '.manifest.json'
+        self.columns = columns
+        self.checkpoint = checkpoint  # number of tournaments flushed to disk at a time
+        self.buffer = []
+        self.buffered = 0
+        self.manifest = None
+
+    def open(self, settings: dict, seed=None, resume=False):
+        """
+        Start writing a run, or resume the run recorded in the manifest.
+        :param settings: settings of the run (JSON serializable), a run only resumes with the same settings
+        :param seed: master seed of the run, taken from the manifest when resuming
+        :param resume: continue after the last tournament recorded in the manifest, if there is one
+        :return: (first TournamentID to play, master seed)
+        """
+        settings = json.loads(json.dumps(settings))
+        if resume and os.path.exists(self.manifestPath):
+            with open(self.manifestPath) as f:
+                self.manifest = json.load(f)
+            if self.manifest['settings'] != settings:
+                raise Exception("Cannot resume {}, it was written with different settings."
+                                .format(os.path.basename(self.path)))
+            self._reopen()
+            # a run that stopped early is no longer finished once more tournaments are written to it
+            self.manifest.update(finished=False, stopped=None)
+            return self.manifest['completed'] + 1, self.manifest['seed']
+
+        self.manifest = {'settings': settings, 'seed': seed, 'completed': 0, 'rows': 0, 'bytes': 0, 'finished': False,
+                         'stopped': None}
+        self._create()
+        self._save_manifest()
+        return 1, seed
+
+    def write(self, tCount, rows: list):
+        """Add the rows of one finished tournament, flushing them to disk at every checkpoint"""
+        self.buffer.extend(rows)
+        self.buffered += 1
+        self.manifest['completed'] = tCount
+        if self.buffered >= self.checkpoint:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows to disk, then record the checkpoint in the manifest"""
+        self._append(self.buffer)
+        self.manifest['rows'] += len(self.buffer)
+        self._save_manifest()
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self, stopped=None):
+        """Flush the last rows and mark the run as finished. If the run ended before its last tournament,
+        stopped gives the reason (e.g. 'precision'), and 'completed' in the manifest the tournaments written"""
+        self.manifest['finished'] = True
+        self.manifest['stopped'] = stopped
+        self.flush()
+
+    def written(self):
+        """This reads back the rows written so far, as pandas dataframes of up to 100000 rows"""
+        import pandas as pd
+        return pd.read_csv(self.path, chunksize=100000)
+
+    def _create(self):
+        with open(self.path, 'w', newline='') as f:
+            csv.writer(f, lineterminator='\n').writerow(self.columns)
+        self.manifest['bytes'] = os.path.getsize(self.path)
+
+    def _reopen(self):
+        # drop anything written after the last checkpoint
+        with open(self.path, 'r+b') as f:
+            f.truncate(self.manifest['bytes'])
+
+    def _append(self, rows):
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, self.columns, lineterminator='\n')
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        self.manifest['bytes'] = os.path.getsize(self.path)
+
+    def _save_manifest(self):
+        # write to a temporary file first, so the manifest on disk is always complete
+        temp = self.manifestPath + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp, self.manifestPath)
+
+
+class ColumnWriter(ResultWriter):
+    """ColumnWriter class - a ResultWriter that writes a typed columnar format instead of csv text:
+    a folder with one .npy file per column, preallocated for the whole run and filled in as tournaments finish.
+    Text columns are stored as integer codes into a list of categories, kept in the folder's 'columns.json'.
+    See read_columns to memory-map the folder back.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'results')
+    >>> w = ColumnWriter(path, {'TournamentID': 'int32', 'PlayerStrategy': 'uint8', 'PlayerScore': 'float64'},
+    ...                  size=4, categories={'PlayerStrategy': ['TFT', 'AllD']})
+    >>> w.open({'times': 2}, seed=7)
+    (1, 7)
+    >>> w.write(1, [{'TournamentID': 1, 'PlayerStrategy': 'TFT', 'PlayerScore': 0.99},
+    ...             {'TournamentID': 1, 'PlayerStrategy': 'AllD', 'PlayerScore': 1.04}])
+    >>> w.write(2, [{'TournamentID': 2, 'PlayerStrategy': 'TFT', 'PlayerScore': 2.5},
+    ...             {'TournamentID': 2, 'PlayerStrategy': 'AllD', 'PlayerScore': 1.5}])
+    >>> w.close()
+    >>> columns, categories = read_columns(path)
+    >>> columns['PlayerStrategy'].tolist(), categories['PlayerStrategy']
+    ([0, 1, 0, 1], ['TFT', 'AllD'])
+    >>> read_dataframe(path).groupby('PlayerStrategy', observed=True)['PlayerScore'].mean().round(3).to_dict()
+    {'TFT': 1.745, 'AllD': 1.27}
+    """
+
+    def __init__(self, path: str, columns: dict, size: int, categories: dict, checkpoint=100):
+        """
+        :param path: folder the columns are written to
+        :param columns: dictionary of form {column: numpy dtype}, text columns get the dtype of their codes
+        :param size: number of rows in the whole run
+        :param categories: dictionary of form {column: list of values} for the text columns
+        :param checkpoint: number of tournaments flushed to disk at a time
+        """
+        super().__init__(path, list(columns), checkpoint)
+        self.types = columns
+        self.size = size
+        self.categories = categories
+        self.codes = {column: {value: code for code, value in enumerate(values)}
+                      for column, values in categories.items()}
+        self.arrays = {}
+
+    def written(self):
+        """This reads back the rows written so far, as a pandas dataframe"""
+        return [read_dataframe(self.path)]
+
+    def _create(self):
+        os.makedirs(self.path, exist_ok=True)
+        for column, dtype in self.types.items():
+            self.arrays[column] = np.lib.format.open_memmap(os.path.join(self.path, column + '.npy'), mode='w+',
+                                                            dtype=dtype, shape=(self.size,))
+        self._save_layout()
+
+    def _reopen(self):
+        # rows after the last checkpoint are simply written over
+        for column in self.types:
+            self.arrays[column] = np.load(os.path.join(self.path, column + '.npy'), mmap_mode='r+')
+        self._save_layout(self.manifest['rows'])
+
+    def _append(self, rows):
+        start = self.manifest['rows']
+        for column, array in self.arrays.items():
+            values = [row[column] for row in rows]
+            if column in self.codes:
+                values = [self.codes[column][value] for value in values]
+            array[start:start + len(rows)] = values
+            array.flush()
+        self._save_layout(start + len(rows))
+
+    def _save_layout(self, rows=0):
+        # the folder keeps its own row count, so it can be read without the manifest
+        layout = {'columns': self.types, 'categories': self.categories, 'rows': rows}
+        temp = os.path.join(self.path, 'columns.json.tmp')
+        with open(temp, 'w') as f:
+            json.dump(layout, f, indent=2)
+        os.replace(temp, os.path.join(self.path, 'columns.json'))
+
+
+def read_columns(path: str):
+    """
+    Memory-map the columns of a folder written by ColumnWriter, without reading them into memory.
+    Only the rows written so far are returned, so the folder of a run still in progress can be read too.
+    :param path: folder of the columns
+    :return: (dictionary of form {column: array}, dictionary of form {column: list of values} for the text columns)
+    """
+    with open(os.path.join(path, 'columns.json')) as f:
+        layout = json.load(f)
+    rows = layout['rows']
+    columns = {column: np.load(os.path.join(path, column + '.npy'), mmap_mode='r')[:rows]
+               for column in layout['columns']}
+    return columns, layout['categories']
+
+
+def read_dataframe(path: str):
+    """
+    Read a folder written by ColumnWriter into a pandas dataframe, with text columns as pandas categoricals
+    :param path: folder of the columns
+    :return: a dataframe with the same columns as the csv results
+    """
+    import pandas as pd
+    columns, categories = read_columns(path)
+    for column, values in categories.items():
+        columns[column] = pd.Categorical.from_codes(columns[column], values)
+    return pd.DataFrame(columns)
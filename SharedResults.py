@@ -0,0 +1,92 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# columns of the buffer and their types: the monte carlo result columns, with PlayerID as the player's slot
+# (its place in the players dict) and PlayerStrategy as a code into the run's list of strategy ids
+columnTypes = {'TournamentID': 'int32', 'PlayerID': 'uint16', 'PlayerStrategy': 'uint8', 'PlayerScore': 'float64',
+               'PlayerWinRate': 'float64', 'PlayerLossRate': 'float64', 'PlayerTieRate': 'float64'}
+
+
+class SharedResults:
+    """SharedResults class - the results of a monte carlo run in a block of shared memory that worker processes
+    write into directly, so a tournament's results never have to be pickled back to the parent.
+    Each column is its own array of shape (times, players) in the block, row tCount - 1 holding tournament tCount.
+    Workers attach to the block by its name. The columns are numpy views on the shared memory, valid until the
+    block is closed, so dataframe() copies them out first.
+
+    >>> with SharedResults(times=2, players=3) as results:
+    ...     other = SharedResults(2, 3, name=results.name)
+    ...     other.write(2, [{'strategy': 'TFT', 'scoreAvg': 2.5, 'winRate': 0.5, 'lossRate': 0, 'tieRate': 0.5}] * 3,
+    ...                 {'TFT': 0})
+    ...     other.close()
+    ...     results.columns['PlayerScore'].tolist()
+    [[0.0, 0.0, 0.0], [2.5, 2.5, 2.5]]
+    """
+
+    def __init__(self, times: int, players: int, name: str = None):
+        """
+        :param times: number of tournaments in the run
+        :param players: number of players in each tournament
+        :param name: name of an existing block to attach to, a new block is created if not given
+        """
+        self.times = times
+        self.players = players
+        self.owner = name is None
+
+        # columns follow one another in the block, each starting on an 8 byte boundary
+        offsets = {}
+        size = 0
+        for column, dtype in columnTypes.items():
+            offsets[column] = size
+            size += -(-times * players * np.dtype(dtype).itemsize // 8) * 8
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=max(size, 1))
+        self.name = self.memory.name
+        self.columns = {column: np.ndarray((times, players), dtype, buffer=self.memory.buf, offset=offsets[column])
+                        for column, dtype in columnTypes.items()}
+
+    def write(self, tCount, tournament: list, strategyCodes: dict):
+        """
+        Write the player stats of one tournament, as returned by play_tournament, to its row
+        :param tCount: the TournamentID of the tournament
+        :param strategyCodes: dictionary of form {strategy id: code}
+        """
+        row = tCount - 1
+        self.columns['TournamentID'][row] = tCount
+        self.columns['PlayerID'][row] = np.arange(len(tournament))
+        self.columns['PlayerStrategy'][row] = [strategyCodes[player['strategy']] for player in tournament]
+        for column, stat in [('PlayerScore', 'scoreAvg'), ('PlayerWinRate', 'winRate'),
+                             ('PlayerLossRate', 'lossRate'), ('PlayerTieRate', 'tieRate')]:
+            self.columns[column][row] = [player[stat] for player in tournament]
+
+    def dataframe(self, playerIDs: list, strategies: list, times=None):
+        """
+        Copy the results out of the block into a pandas dataframe with the same columns and types as
+        Tournament.run_MCsim returns, one vectorised copy per column
+        :param playerIDs: player names, by slot
+        :param strategies: strategy ids, by code
+        :param times: number of tournaments written, all of them if not given
+        """
+        import pandas as pd
+        rows = slice(0, self.times if times is None else times)
+        columns = {column: values[rows].ravel() for column, values in self.columns.items()}
+        columns['TournamentID'] = columns['TournamentID'].astype(np.int64)
+        columns['PlayerID'] = np.array(playerIDs, dtype=object)[columns['PlayerID']]
+        columns['PlayerStrategy'] = np.array(strategies, dtype=object)[columns['PlayerStrategy']]
+        for column in ['PlayerScore', 'PlayerWinRate', 'PlayerLossRate', 'PlayerTieRate']:
+            columns[column] = columns[column].copy()
+        return pd.DataFrame(columns, copy=False)
+
+    def close(self):
+        """Let go of the block in this process. The column views go first, as they can't outlive the block"""
+        self.columns = {}
+        self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # the process that created the block also removes it
+        self.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import sys
+import time
+
+import Strategy
+import Tournament
+
+# settings a config can give, with the values used when it leaves them out. players is required
+configDefaults = {'players': None, 'times': 1000, 'numrounds': 100, 'noisegrowth': 0.01, 'noisemax': 0.5, 'mode': 'I',
+                  'payoffs': [5, 3, 1, 0], 'engine': 'game', 'workers': 1, 'seed': None, 'output': None,
+                  'format': 'csv', 'checkpoint': 100, 'resume': False, 'precision': None, 'mintimes': 30,
+                  'trace': None}
+
+
+def strategy_class(name: str):
+    """
+    The strategy class of a strategy id (as in the results, 'TFT') or class name ('TitForTat')
+
+    >>> strategy_class('TFT'), strategy_class('TitForTat')
+    (<class 'Strategy.TitForTat'>, <class 'Strategy.TitForTat'>)
+    >>> strategy_class('XYZ')
+    Traceback (most recent call last):
+    Exception: Unknown strategy XYZ.
+    """
+    for strategy in Tournament.allStrategies:
+        if strategy().id == name:
+            return strategy
+    strategy = getattr(Strategy, name, None)
+    if isinstance(strategy, type) and issubclass(strategy, Strategy.Strategy):
+        return strategy
+    raise Exception("Unknown strategy {}.".format(name))
+
+
+def read_config(config: dict):
+    """
+    Check a config and fill in the settings it leaves out
+    :param config: dictionary of settings from configDefaults, with players of form {strategy id or name: count}
+    :return: the config with every setting in configDefaults
+
+    >>> config = read_config({'players': {'TFT': 2, 'AllD': 2}, 'times': 10})
+    >>> config['times'], config['mode'], config['output']
+    (10, 'I', None)
+    >>> read_config({'players': {'TFT': 2}, 'rounds': 10})
+    Traceback (most recent call last):
+    Exception: Unknown setting rounds in config.
+    >>> read_config({'times': 10})
+    Traceback (most recent call last):
+    Exception: Config must give the players, as {strategy: count}.
+    """
+    for setting in config:
+        if setting not in configDefaults:
+            raise Exception("Unknown setting {} in config.".format(setting))
+    if not config.get('players'):
+        raise Exception("Config must give the players, as {strategy: count}.")
+    return dict(configDefaults, **config)
+
+
+def run(config: dict):
+    """
+    Run the monte carlo simulation a config describes.
+    With an output, results are written to 'Results/<output>.csv' (or the folder 'Results/<output>' for the npy format)
+    and pandas is never imported. Without one, the per-strategy summary (see Aggregator) is returned.
+    :param config: settings, see read_config
+    :return: the summary dataframe, or None if results were written to an output
+
+    >>> s = run({'players': {'TFT': 2, 'RAND': 2}, 'times': 5, 'seed': 1})
+    >>> s.index.tolist(), s['Count'].tolist()
+    (['TFT', 'RAND'], [10, 10])
+    """
+    config = read_config(config)
+    players = Tournament.create_playerlist({strategy_class(name): count
+                                            for name, count in config['players'].items()})
+    settings = {setting: config[setting] for setting in ['times', 'numrounds', 'noisegrowth', 'noisemax', 'mode',
+                                                         'payoffs', 'engine', 'workers', 'seed', 'precision',
+                                                         'mintimes', 'trace']}
+    if config['output'] is None:
+        return Tournament.run_MCsim(players, summary=True, **settings)
+    Tournament.run_MCsim(players, filename=config['output'], format=config['format'],
+                         checkpoint=config['checkpoint'], resume=config['resume'], **settings)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the monte carlo simulation described by a JSON config.')
+    parser.add_argument('config', help='JSON file of settings: players ({strategy: count}) and any of '
+                                       + ', '.join(list(configDefaults)[1:]))
+    parser.add_argument('--times', type=int, help='how many times the tournament is run')
+    parser.add_argument('--workers', type=int, help='number of worker processes')
+    parser.add_argument('--seed', type=int, help='master seed of the run')
+    parser.add_argument('--output', help="name of the results in the Results folder, without extension")
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run of output')
+    args = parser.parse_args(args)
+
+    with open(args.config) as f:
+        config = json.load(f)
+    # settings given on the command line win over the config
+    for setting in ['times', 'workers', 'seed', 'output']:
+        if getattr(args, setting) is not None:
+            config[setting] = getattr(args, setting)
+    if args.resume:
+        config['resume'] = True
+
+    start = time.perf_counter()
+    summary = run(config)
+    if summary is None:
+        path = config['output'] + ('.csv' if config.get('format', 'csv') == 'csv' else '')
+        print('Results written to Results/{} in {:.1f}s'.format(path, time.perf_counter() - start))
+    else:
+        print(summary.to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import functools
+
+import numpy as np
+
+import History
+import Player
+import Strategy
+
+# move code of a random move in compiled move tables (C = 0, D = 1)
+randomMove = 2
+
+# compiled machines kept by compile_strategy. The machines of strategies that count moves grow with the rounds of
+# the game, to millions of states for long games, so only the most recently used ones are kept
+cachedMachines = 32
+
+
+class Machine:
+    """Machine class - a strategy compiled from its finite-state machine form into integer lookup tables.
+    States are numbered from 0 (the first state). moves[state] is the move code made in a state,
+    and transitions[state, round code] the state after a perceived round (see History.roundCodes).
+
+    >>> m = compile_strategy(Strategy.TitForTat)
+    >>> m.states
+    ['C', 'D']
+    >>> m.moves.tolist()
+    [0, 1]
+    >>> m.transitions.tolist()
+    [[0, 1, 0, 1], [0, 1, 0, 1]]
+    >>> len(compile_strategy(Strategy.SoftMajority, rounds=10).states)
+    19
+    """
+
+    def __init__(self, strategy: Strategy, states: list, moves, transitions):
+        self.strategy = strategy
+        self.id = strategy().id
+        self.states = states
+        self.moves = moves
+        self.transitions = transitions
+
+    @property
+    def isRandom(self):
+        """True if the machine makes a random move in any state"""
+        return bool((self.moves == randomMove).any())
+
+
+@functools.lru_cache(maxsize=cachedMachines)
+def compile_strategy(strategy: Strategy, rounds=100):
+    """This compiles a strategy class into a Machine. Only the states reachable within a game of the given number of
+    rounds are numbered, so strategies whose state grows with the game (e.g. counts of moves) stay finite.
+    Their machines (SM, HM, GRAD) have about one or two states per round, and take time linear in rounds to compile.
+    The last cachedMachines machines compiled are cached by strategy and rounds.
+
+    >>> len(compile_strategy(Strategy.SoftMajority, rounds=1000).states), compile_strategy.cache_info().maxsize
+    (1999, 32)
+    """
+    s = strategy()
+    if s.firstState is None:
+        raise Exception("Strategy {} has no finite-state machine form.".format(s.id))
+
+    # number the reachable states breadth first: the first state is used in round 1, its successors in round 2, ...
+    states = [s.firstState]
+    index = {s.firstState: 0}
+    frontier = [s.firstState]
+    for depth in range(1, rounds):
+        reached = []
+        for state in frontier:
+            for round in History.allRounds:
+                nextState = s.next_state(state, round)
+                if nextState not in index:
+                    index[nextState] = len(states)
+                    states.append(nextState)
+                    reached.append(nextState)
+        frontier = reached
+        if not frontier:
+            break
+
+    # build the tables; transitions out of the game's last round are never used, they stay in place
+    moves = np.zeros(len(states), dtype=np.uint8)
+    transitions = np.zeros((len(states), len(History.allRounds)), dtype=np.int32)
+    for i, state in enumerate(states):
+        move = s.state_move(state)
+        moves[i] = randomMove if move is None else Strategy.moveCodes[move]
+        for code, round in enumerate(History.allRounds):
+            transitions[i, code] = index.get(s.next_state(state, round), i)
+
+    return Machine(strategy, states, moves, transitions)
+
+
+class MachineTable:
+    """MachineTable class - several compiled strategies stacked into one pair of lookup tables,
+    so games between any strategies can be advanced together with one array index per round.
+
+    >>> t = MachineTable([Strategy.AlwaysDefect, Strategy.TitForTat])
+    >>> t.first
+    {'AllD': 0, 'TFT': 1}
+    >>> t.moves.tolist()
+    [1, 0, 1]
+    >>> t.transitions[1].tolist()
+    [1, 2, 1, 2]
+    """
+
+    def __init__(self, strategies: list, rounds=100):
+        machines = [compile_strategy(strategy, rounds) for strategy in dict.fromkeys(strategies)]
+
+        # state numbers of each machine are shifted by the states of the machines before it
+        self.first = {}
+        offset = 0
+        for machine in machines:
+            self.first[machine.id] = offset
+            offset += len(machine.states)
+        self.moves = np.concatenate([machine.moves for machine in machines])
+        self.transitions = np.concatenate([machine.transitions + self.first[machine.id] for machine in machines])
+
+
+def verify(strategy: Strategy, rounds=100, games=20, seed=None):
+    """This checks a strategy's compiled machine against its class-based next_move (the reference path),
+    by feeding both the same random perceived opponent moves. Returns True if every move agrees.
+
+    >>> import Tournament
+    >>> all(verify(strategy, seed=1) for strategy in Tournament.allStrategies if strategy is not Strategy.Random)
+    True
+    """
+    machine = compile_strategy(strategy, rounds)
+    rng = np.random.default_rng(seed)
+    player = Player.Player(strategy)
+    for game in range(games):
+        player.history = []
+        state = 0
+        for theirMove in rng.integers(0, 2, rounds).tolist():
+            move = player.strategy.next_move(player)
+            if Strategy.moveCodes[move] != machine.moves[state]:
+                return False
+            code = 2 * Strategy.moveCodes[move] + theirMove
+            player.remember(code)
+            state = machine.transitions[state, code]
+    return True
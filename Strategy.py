@@ -1,5 +1,3 @@
-import random
-
 class Strategy:
     """Superclass of all strategies. For a list of all strategies refer to:
     http://www.prisoners-dilemma.com/strategies.html
@@ -11,9 +9,34 @@ class Strategy:
         else:
             pass
 
+        # how many past rounds of the player's history next_move() reads, None if it may read the whole game
+        self.lookback = None
+
+        # Finite-state machine form of the strategy, compiled into lookup tables by StateMachine.compile_strategy().
+        # The strategy starts in firstState, makes state_move(state) in each state ('C', 'D' or None for a random
+        # move) and goes to next_state(state, round) after each perceived round (my move, their move).
+        # None if the strategy has no finite-state machine form.
+        self.firstState = None
+
+    # Counts and countdowns a strategy keeps over a game, besides the player's history: a class with __slots__,
+    # one object of which is made for each player by new_state() and kept as player.state.
+    # next_move() starts it over on the first move of each game, so the same object serves every game.
+    # None if the strategy only reads the history.
+    State = None
+
+    def new_state(self):
+        """This makes the object a player keeps the strategy's game state in, None if it needs none"""
+        return None if self.State is None else self.State()
+
     def next_move(self, player):
         pass
 
+    def state_move(self, state):
+        return state
+
+    def next_state(self, state, round):
+        return state
+
 def flip(play):
     """This flips the player's move from 'C' to 'D' or from 'D' to 'C', if called due to noise
 
@@ -27,6 +50,10 @@ def flip(play):
     else:
          return 'C'
 
+# integer codes for moves, used wherever moves are stored in arrays (C = 0, D = 1)
+moveCodes = {'C': 0, 'D': 1}
+moveLetters = 'CD'
+
 # Basic Strategies
 
 class AlwaysCooperate(Strategy):
@@ -35,6 +62,8 @@ class AlwaysCooperate(Strategy):
         super().__init__()
         self.name = 'Always Cooperate'
         self.id = 'AllC'
+        self.lookback = 0
+        self.firstState = 'C'
 
     def next_move(self, player):
         return 'C'
@@ -46,6 +75,8 @@ class AlwaysDefect(Strategy):
         super().__init__()
         self.name = 'Always Defect'
         self.id = 'AllD'
+        self.lookback = 0
+        self.firstState = 'D'
 
     def next_move(self, player):
         return 'D'
@@ -57,9 +88,16 @@ class Random(Strategy):
         super().__init__()
         self.name = 'Random'
         self.id = 'RAND'
+        self.lookback = 0
+        self.firstState = 'R'
 
     def next_move(self, player):
-        return random.choice(['D', 'C'])
+        # random moves are drawn in advance by the game, in blocks of equal size (or one block for a short game)
+        return player.randomMoves[len(player.history) % len(player.randomMoves)]
+
+    # finite-state machine form: a single state, in which the move is random
+    def state_move(self, state):
+        return None
 
 
 # Tit for Tat Strategies
@@ -70,6 +108,8 @@ class TitForTat(Strategy):
         super().__init__()
         self.name = 'Tit For Tat'
         self.id = 'TFT'
+        self.lookback = 1
+        self.firstState = 'C'
 
     def next_move(self, player):
         if player.history:
@@ -77,6 +117,10 @@ class TitForTat(Strategy):
         else:
             return 'C'
 
+    # finite-state machine form: the state is the next move
+    def next_state(self, state, round):
+        return round[1]
+
 
 class TitForTwoTats(Strategy):
     """Cooperates on the first move, and defects only when the opponent defects two times."""
@@ -84,6 +128,8 @@ class TitForTwoTats(Strategy):
         super().__init__()
         self.name = 'Tit for Two Tats'
         self.id = 'TFTT'
+        self.lookback = 2
+        self.firstState = 0
 
     def next_move(self, player):
         if player.history:
@@ -94,6 +140,13 @@ class TitForTwoTats(Strategy):
         else:
             return 'C'
 
+    # finite-state machine form: the state is the opponent's defection streak, counted up to 2
+    def state_move(self, state):
+        return 'D' if state == 2 else 'C'
+
+    def next_state(self, state, round):
+        return min(state + 1, 2) if round[1] == 'D' else 0
+
 
 class TwoTitsForTat(Strategy):
     """Same as Tit for Tat except that it defects twice when the opponent defects."""
@@ -101,21 +154,41 @@ class TwoTitsForTat(Strategy):
         super().__init__()
         self.name = 'Two Tits for Tat'
         self.id = 'TTFT'
+        self.lookback = 1
+        self.firstState = ('C', 0)
+
+    class State:
+        __slots__ = ('movesCountdown',)
+
+        def __init__(self):
+            self.movesCountdown = 0
 
     def next_move(self, player):
+        state = player.state
         if player.history:
-            if player.movesCountdown:
-                player.movesCountdown -= 1
+            if state.movesCountdown:
+                state.movesCountdown -= 1
                 return 'D'
             if player.theirLastMove == 'D':
-                player.movesCountdown = 1
+                state.movesCountdown = 1
                 return 'D'
             else:
                 return 'C'
         else:
-            player.movesCountdown = 0  # reset moves countdown at start of each game
+            state.movesCountdown = 0  # reset moves countdown at start of each game
             return 'C'
 
+    # finite-state machine form: the state is (next move, moves countdown)
+    def state_move(self, state):
+        return state[0]
+
+    def next_state(self, state, round):
+        if state[1]:
+            return ('D', state[1] - 1)
+        if round[1] == 'D':
+            return ('D', 1)
+        return ('C', 0)
+
 
 class FirmButFair(Strategy):
     """Cooperates on the first move, and cooperates except after receiving a sucker payoff."""
@@ -123,6 +196,8 @@ class FirmButFair(Strategy):
         super().__init__()
         self.name = 'Firm But Fair'
         self.id = 'FBF'
+        self.lookback = 1
+        self.firstState = 'C'
 
     def next_move(self, player):
         if player.history:
@@ -133,6 +208,10 @@ class FirmButFair(Strategy):
         else:
             return 'C'
 
+    # finite-state machine form: the state is the next move
+    def next_state(self, state, round):
+        return 'D' if round == ('C', 'D') else 'C'
+
 
 class SuspiciousTitForTat(Strategy):
     """Same as TFT, except that it defects on the first move."""
@@ -140,6 +219,8 @@ class SuspiciousTitForTat(Strategy):
         super().__init__()
         self.name = 'Suspicious Tit For Tat'
         self.id = 'STFT'
+        self.lookback = 1
+        self.firstState = 'D'
 
     def next_move(self, player):
         if player.history:
@@ -147,6 +228,10 @@ class SuspiciousTitForTat(Strategy):
         else:
             return 'D'
 
+    # finite-state machine form: the state is the next move
+    def next_state(self, state, round):
+        return round[1]
+
 
 class HardTitForTat(Strategy):
     """Cooperates on the first move, and defects if the opponent has defects on any of the previous three moves,
@@ -155,6 +240,8 @@ class HardTitForTat(Strategy):
         super().__init__()
         self.name = 'Hard Tit For Tat'
         self.id = 'HTFT'
+        self.lookback = 3
+        self.firstState = 3
 
     def next_move(self, player):
         if player.history:
@@ -165,6 +252,13 @@ class HardTitForTat(Strategy):
         else:
             return 'C'
 
+    # finite-state machine form: the state is how many rounds ago the opponent last defected, counted up to 3
+    def state_move(self, state):
+        return 'D' if state < 3 else 'C'
+
+    def next_state(self, state, round):
+        return 0 if round[1] == 'D' else min(state + 1, 3)
+
 
 class ReverseTitForTat(Strategy):
     """It does the reverse of TFT.
@@ -173,6 +267,8 @@ class ReverseTitForTat(Strategy):
         super().__init__()
         self.name = 'Reverse Tit for Tat'
         self.id = 'RTFT'
+        self.lookback = 1
+        self.firstState = 'D'
 
     def next_move(self, player):
         if player.history:
@@ -180,6 +276,10 @@ class ReverseTitForTat(Strategy):
         else:
             return 'D'
 
+    # finite-state machine form: the state is the next move
+    def next_state(self, state, round):
+        return flip(round[1])
+
 # Punishing Strategies
 
 class GrimTrigger(Strategy):
@@ -188,6 +288,8 @@ class GrimTrigger(Strategy):
         super().__init__()
         self.name = 'Grim Trigger'
         self.id = 'GRIM'
+        self.lookback = 1  # has_recently_defected() answers from the player's running statistics
+        self.firstState = 'C'
 
     def next_move(self, player):
         if player.history:
@@ -198,6 +300,10 @@ class GrimTrigger(Strategy):
         else:
             return 'C'
 
+    # finite-state machine form: the state is the next move, 'D' for good once the opponent defects
+    def next_state(self, state, round):
+        return 'D' if round[1] == 'D' else state
+
 
 class SoftGrudger(Strategy):
     """Like GRIM except that the opponent is punished with D,D,D,D,C,C."""
@@ -205,26 +311,50 @@ class SoftGrudger(Strategy):
         super().__init__()
         self.name = 'Soft Grudger'
         self.id = 'SGRIM'
+        self.lookback = 1
+        self.firstState = ('C', 0, 0)
+
+    class State:
+        __slots__ = ('defectionCountdown', 'cooperationCountdown')
+
+        def __init__(self):
+            self.defectionCountdown = 0
+            self.cooperationCountdown = 0
 
     def next_move(self, player):
+        state = player.state
         if player.history:
-            if player.defectionCountdown:
-                player.defectionCountdown -= 1
+            if state.defectionCountdown:
+                state.defectionCountdown -= 1
                 return 'D'
-            elif player.cooperationCountdown:
-                player.cooperationCountdown -= 1
+            elif state.cooperationCountdown:
+                state.cooperationCountdown -= 1
                 return 'C'
             elif player.theirLastMove == 'D':
-                player.defectionCountdown = 3
-                player.cooperationCountdown = 2
+                state.defectionCountdown = 3
+                state.cooperationCountdown = 2
                 return 'D'
             else:
                 return 'C'
         else:
-            player.defectionCountdown = 0
-            player.cooperationCountdown = 0
+            state.defectionCountdown = 0
+            state.cooperationCountdown = 0
             return 'C'
 
+    # finite-state machine form: the state is (next move, defection countdown, cooperation countdown)
+    def state_move(self, state):
+        return state[0]
+
+    def next_state(self, state, round):
+        move, defectionCountdown, cooperationCountdown = state
+        if defectionCountdown:
+            return ('D', defectionCountdown - 1, cooperationCountdown)
+        elif cooperationCountdown:
+            return ('C', 0, cooperationCountdown - 1)
+        elif round[1] == 'D':
+            return ('D', 3, 2)
+        return ('C', 0, 0)
+
 
 class Gradual(Strategy):
     """Cooperates on the first move, and cooperates as long as the opponent cooperates.
@@ -235,35 +365,64 @@ class Gradual(Strategy):
         super().__init__()
         self.name = 'Gradual'
         self.id = 'GRAD'
+        self.lookback = 1
+        self.firstState = ('C', 0, 0, 0)
+
+    class State:
+        __slots__ = ('defectionCount', 'defectionCountdown', 'cooperationCountdown')
+
+        def __init__(self):
+            self.defectionCount = 0
+            self.defectionCountdown = 0
+            self.cooperationCountdown = 0
 
     def next_move(self, player):
+        state = player.state
         if player.history:
 
             # check countdowns, start countdowns if needed (other player plays 'D')
-            if not player.cooperationCountdown and not player.defectionCountdown:
+            if not state.cooperationCountdown and not state.defectionCountdown:
                 if player.theirLastMove == 'D':
-                    player.defectionCount += 1
-                    player.defectionCountdown = player.defectionCount
-                    player.cooperationCountdown = 2
+                    state.defectionCount += 1
+                    state.defectionCountdown = state.defectionCount
+                    state.cooperationCountdown = 2
                 elif player.theirLastMove == 'C':
                     return 'C'
 
             # when 'D' punishment is in effect
-            if player.defectionCountdown:
-                player.defectionCountdown -= 1
+            if state.defectionCountdown:
+                state.defectionCountdown -= 1
                 return 'D'
             # two 'C' forgiveness
             else:
-                player.cooperationCountdown -= 1
+                state.cooperationCountdown -= 1
                 return 'C'
 
         else:
             # reset countdowns at start of each game
-            player.defectionCount = 0
-            player.defectionCountdown = 0
-            player.cooperationCountdown = 0
+            state.defectionCount = 0
+            state.defectionCountdown = 0
+            state.cooperationCountdown = 0
             return 'C'
 
+    # finite-state machine form: the state is (next move, defection count, defection countdown,
+    # cooperation countdown). The defection count grows with the game, so the machine is bounded by its length.
+    def state_move(self, state):
+        return state[0]
+
+    def next_state(self, state, round):
+        move, defectionCount, defectionCountdown, cooperationCountdown = state
+        if not cooperationCountdown and not defectionCountdown:
+            if round[1] == 'D':
+                defectionCount += 1
+                defectionCountdown = defectionCount
+                cooperationCountdown = 2
+            else:
+                return ('C', defectionCount, 0, 0)
+        if defectionCountdown:
+            return ('D', defectionCount, defectionCountdown - 1, cooperationCountdown)
+        return ('C', defectionCount, 0, cooperationCountdown - 1)
+
 
 # Opportunistic Strategies
 
@@ -275,6 +434,8 @@ class Pavlov(Strategy):
         super().__init__()
         self.name = 'Pavlov'
         self.id = 'PAV'
+        self.lookback = 1
+        self.firstState = 'C'
 
     def next_move(self, player):
         if player.history:
@@ -285,6 +446,10 @@ class Pavlov(Strategy):
         else:
             return 'C'
 
+    # finite-state machine form: the state is the next move
+    def next_state(self, state, round):
+        return round[0] if round[1] == 'C' else flip(round[0])
+
 
 class SoftMajority(Strategy):
     """Cooperates on the first move, and cooperates as long as the number of times the opponent has cooperated
@@ -293,23 +458,41 @@ class SoftMajority(Strategy):
         super().__init__()
         self.name = 'Soft Majority'
         self.id = 'SM'
+        self.lookback = 1
+        self.firstState = 0
+
+    class State:
+        __slots__ = ('cooperationCount', 'defectionCount')
+
+        def __init__(self):
+            self.cooperationCount = 0
+            self.defectionCount = 0
 
     def next_move(self, player):
+        state = player.state
         if player.history:
             if player.theirLastMove == 'D':
-                player.defectionCount += 1
+                state.defectionCount += 1
             else:
-                player.cooperationCount += 1
+                state.cooperationCount += 1
 
-            if player.cooperationCount >= player.defectionCount:
+            if state.cooperationCount >= state.defectionCount:
                 return 'C'
             else:
                 return 'D'
         else:
-            player.cooperationCount = 0
-            player.defectionCount = 0
+            state.cooperationCount = 0
+            state.defectionCount = 0
             return 'C'
 
+    # finite-state machine form: the state is the opponent's cooperations minus its defections.
+    # It grows with the game, so the machine is bounded by its length.
+    def state_move(self, state):
+        return 'C' if state >= 0 else 'D'
+
+    def next_state(self, state, round):
+        return state + 1 if round[1] == 'C' else state - 1
+
 
 class HardMajority(Strategy):
     """Defects on the first move, and defects if the number of defections of the opponent
@@ -318,19 +501,37 @@ class HardMajority(Strategy):
         super().__init__()
         self.name = 'Hard Majority'
         self.id = 'HM'
+        self.lookback = 1
+        self.firstState = 0
+
+    class State:
+        __slots__ = ('cooperationCount', 'defectionCount')
+
+        def __init__(self):
+            self.cooperationCount = 0
+            self.defectionCount = 0
 
     def next_move(self, player):
+        state = player.state
         if player.history:
             if player.theirLastMove == 'D':
-                player.defectionCount += 1
+                state.defectionCount += 1
             else:
-                player.cooperationCount += 1
+                state.cooperationCount += 1
 
-            if player.defectionCount >= player.cooperationCount:
+            if state.defectionCount >= state.cooperationCount:
                 return 'D'
             else:
                 return 'C'
         else:
-            player.cooperationCount = 0
-            player.defectionCount = 0
+            state.cooperationCount = 0
+            state.defectionCount = 0
             return 'D'
+
+    # finite-state machine form: the state is the opponent's cooperations minus its defections.
+    # It grows with the game, so the machine is bounded by its length.
+    def state_move(self, state):
+        return 'D' if state <= 0 else 'C'
+
+    def next_state(self, state, round):
+        return state + 1 if round[1] == 'C' else state - 1
@@ -0,0 +1,187 @@
+import functools
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Tournament
+
+# settings of run_MCsim that a sweep can vary, with the values used when a grid leaves them out
+sweepSettings = {'numrounds': 100, 'noisegrowth': 0.01, 'noisemax': 0.5, 'mode': 'I', 'payoffs': (5, 3, 1, 0)}
+
+# columns of a sweep's consolidated results, the cell settings (payoffs split in four) followed by resultColumns
+cellColumns = ['CellID', 'numrounds', 'noisegrowth', 'noisemax', 'mode', 'T', 'R', 'P', 'S']
+
+
+def grid_cells(grid: dict):
+    """
+    Every combination of the values in a grid, as dictionaries of run_MCsim settings
+    :param grid: dictionary of form {setting: list of values}, settings from sweepSettings
+    :return: a list of dictionaries, one per cell, with every setting in sweepSettings
+
+    >>> cells = grid_cells({'mode': ['I', 'P'], 'noisemax': [0, 0.5]})
+    >>> len(cells)
+    4
+    >>> cells[1]
+    {'numrounds': 100, 'noisegrowth': 0.01, 'noisemax': 0.5, 'mode': 'I', 'payoffs': (5, 3, 1, 0)}
+    >>> grid_cells({'players': [2, 4]})
+    Traceback (most recent call last):
+    Exception: Cannot sweep over players, a grid can only vary numrounds, noisegrowth, noisemax, mode, payoffs.
+    """
+    for setting in grid:
+        if setting not in sweepSettings:
+            raise Exception("Cannot sweep over {}, a grid can only vary {}.".format(setting, ', '.join(sweepSettings)))
+    cells = []
+    for values in itertools.product(*grid.values()):
+        cell = dict(sweepSettings, **dict(zip(grid, values)))
+        cell['payoffs'] = tuple(cell['payoffs'])
+        cells.append(cell)
+    return cells
+
+
+def cell_id(cell: dict):
+    """A short id made from a cell's settings, so a cell keeps its files and seed when the grid around it changes"""
+    return hashlib.sha1(json.dumps(cell, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def cell_seed(seed: int, cellID: str):
+    """The master seed of one cell's monte carlo run, derived from the sweep seed and the cell id"""
+    words = np.random.SeedSequence(seed, spawn_key=(int(cellID, 16),)).generate_state(2, np.uint64)
+    return int(words[0]) << 64 | int(words[1])
+
+
+def run_sweep(players: dict, grid: dict, name: str, times=1000, workers=1, seed=None, engine='game', checkpoint=100):
+    """
+    Run the monte carlo simulation for every cell of a grid of settings, and consolidate the results.
+    Each cell is written to 'Results/<name>/<CellID>.csv' with checkpoints (see ResultWriter), so running the
+    same sweep again skips the cells already finished and resumes the one that was interrupted. The players, times
+    and engine of a sweep are kept with its seed, and running it again with others raises an error, as their
+    results can't be consolidated with those of the cells already run.
+    All cells share one pool of workers, and up to workers cells run at once, each keeping its tournaments queued on
+    the pool, so the pool doesn't drain at the end of a cell and small cells don't leave workers idle.
+    Results are the same whatever the number of workers. When every cell is done, their results are written together to
+    'Results/<name>.csv', with the settings of each cell in its rows, and an index of the cells to
+    'Results/<name>/index.csv'.
+    :param players: players that will be in each tournament
+    :param grid: dictionary of form {setting: list of values}, see grid_cells
+    :param name: name of the sweep, used for its folder and consolidated file in Results
+    :param times: how many times the tournament is run in each cell
+    :param workers: number of processes the tournaments are spread over
+    :param seed: master seed of the sweep, each cell gets its own seed derived from it.
+                 If not given one is drawn, and it is kept in 'Results/<name>/sweep.json' for later runs.
+    :param engine: play games one at a time ('game') or in lockstep as arrays ('batch'), see play_tournament
+    :param checkpoint: number of tournaments written to a cell's csv file at a time
+
+    The example runs in a temporary folder, which is removed (and the working folder restored) even if it fails,
+    so it leaves the Results folder as it is:
+
+    >>> import shutil, tempfile
+    >>> playerlist = Tournament.create_playerlist({Tournament.Strategy.TitForTat: 2, Tournament.Strategy.Random: 2})
+    >>> grid = {'mode': ['I', 'P'], 'noisemax': [0.1, 0.5]}
+    >>> here, temp = os.getcwd(), tempfile.mkdtemp()
+    >>> try:
+    ...     os.makedirs(os.path.join(temp, 'Results'))
+    ...     os.chdir(temp)
+    ...     run_sweep(playerlist, grid, 'sweep', times=3, seed=1)
+    ...     results = load_sweep('sweep')
+    ...     run_sweep(playerlist, grid, 'pooled', times=3, seed=1, workers=2)
+    ...     pooled = load_sweep('pooled')
+    ...     run_sweep(playerlist, grid, 'sweep', times=4)
+    ... except Exception as error:
+    ...     print(error)
+    ... finally:
+    ...     os.chdir(here)
+    ...     shutil.rmtree(temp)
+    Sweep in Results/sweep was run with other players, times or engine.
+    >>> len(results), list(results.index.names[:3])
+    (48, ['numrounds', 'noisegrowth', 'noisemax'])
+    >>> results.loc[(100, 0.01, 0.5, 'P')]['TournamentID'].unique().tolist()
+    [1, 2, 3]
+    >>> pooled.equals(results)
+    True
+    """
+    folder = os.path.join('Results', name)
+    os.makedirs(folder, exist_ok=True)
+    run = {'players': {playerName: player.strategy.id for playerName, player in players.items()}, 'times': times,
+           'engine': engine}
+    seed = _sweep_seed(folder, seed, run)
+    cells = {cell_id(cell): cell for cell in grid_cells(grid)}
+
+    # a finished cell is only checked against the run by its manifest (see ResultWriter), and plays nothing
+    pool = Tournament.start_pool(players, workers) if workers > 1 else None
+    cellRuns = [functools.partial(Tournament.run_MCsim, players, times, name + '/' + cellID, engine=engine,
+                                  workers=workers, seed=cell_seed(seed, cellID), resume=True, checkpoint=checkpoint,
+                                  pool=pool, **cell)
+                for cellID, cell in cells.items()]
+    try:
+        if pool is None:
+            for cellRun in cellRuns:
+                cellRun()
+        else:
+            # each cell runs in a thread of this process that queues its tournaments on the pool and writes its file
+            threads = ThreadPoolExecutor(workers)
+            try:
+                for future in [threads.submit(cellRun) for cellRun in cellRuns]:
+                    future.result()
+            finally:
+                threads.shutdown(cancel_futures=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    _consolidate(name, cells)
+
+
+def load_sweep(name: str):
+    """
+    Read the consolidated results of a sweep into a pandas dataframe, indexed by the settings of each cell
+    :param name: name of the sweep
+    :return: dataframe of results, with index (numrounds, noisegrowth, noisemax, mode, T, R, P, S)
+    """
+    results = pd.read_csv(os.path.join('Results', name + '.csv'), float_precision='round_trip')
+    return results.set_index(cellColumns[1:]).sort_index()
+
+
+def _sweep_seed(folder, seed, run):
+    # the seed of a sweep is kept in its folder with the players, times and engine of the run, so running the
+    # sweep again plays the same tournaments, and never adds cells of other players to it
+    path = os.path.join(folder, 'sweep.json')
+    run = json.loads(json.dumps(run))
+    if os.path.exists(path):
+        with open(path) as f:
+            kept = json.load(f)
+        if seed is not None and seed != kept['seed']:
+            raise Exception("Sweep in {} was started with seed {}, not {}.".format(folder, kept['seed'], seed))
+        if kept.get('run', run) != run:
+            raise Exception("Sweep in {} was run with other players, times or engine.".format(folder))
+        return kept['seed']
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    with open(path, 'w') as f:
+        json.dump({'seed': seed, 'run': run}, f)
+    return seed
+
+
+def _consolidate(name, cells):
+    # cell files are copied into the consolidated file in chunks, so a sweep of any size fits in memory
+    folder = os.path.join('Results', name)
+    index = []
+    header = True
+    with open(os.path.join('Results', name + '.csv'), 'w', newline='') as out:
+        for cellID, cell in cells.items():
+            settings = [cellID, cell['numrounds'], cell['noisegrowth'], cell['noisemax'], cell['mode']]
+            settings += list(cell['payoffs'])
+            rows = 0
+            for chunk in pd.read_csv(os.path.join(folder, cellID + '.csv'), chunksize=100000,
+                                     float_precision='round_trip'):
+                for column, value in reversed(list(zip(cellColumns, settings))):
+                    chunk.insert(0, column, value)
+                chunk.to_csv(out, header=header, index=False)
+                header = False
+                rows += len(chunk)
+            index.append(settings + [rows])
+    pd.DataFrame(index, columns=cellColumns + ['Rows']).to_csv(os.path.join(folder, 'index.csv'), index=False)
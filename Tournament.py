@@ -1,9 +1,19 @@
+import math
 import random
-import pandas as pd
+from collections import deque
 
+import numpy as np
+
+import Aggregator
+import BatchGame
 import Game
+import OutcomeCache
+import PairStore
 import Player
+import ResultWriter
+import SharedResults
 import Strategy
+import TraceRecorder
 
 
 # a list of all strategies, to be used to build a player's list
@@ -13,6 +23,14 @@ allStrategies = [Strategy.AlwaysCooperate, Strategy.AlwaysDefect, Strategy.Rando
                  Strategy.GrimTrigger, Strategy.SoftGrudger, Strategy.Gradual, Strategy.Pavlov,
                  Strategy.SoftMajority, Strategy.HardMajority]
 
+# columns of the monte carlo results table, in order
+resultColumns = ['TournamentID', 'PlayerID', 'PlayerStrategy', 'PlayerScore', 'PlayerWinRate', 'PlayerLossRate',
+                 'PlayerTieRate']
+
+# types of the result columns in the columnar format, text columns are stored as category codes
+resultTypes = {'TournamentID': 'int32', 'PlayerID': 'uint16', 'PlayerStrategy': 'uint8', 'PlayerScore': 'float64',
+               'PlayerWinRate': 'float64', 'PlayerLossRate': 'float64', 'PlayerTieRate': 'float64'}
+
 
 # function to create player list out of how many times each strategy should appear
 def create_playerlist(strategies: dict):
@@ -58,7 +76,9 @@ def create_randomized_playerlist(strategies: list, min: int, max: int):
 
 
 # function to play tournament and generate list of all player stats for each game
-def play_tournament(players, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode='I'):
+def play_tournament(players, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode='I', engine='game', seed=None,
+                    retain='scores', cache=True, payoffs=(5, 3, 1, 0), workers=1, resultCache=None,
+                    pairStore=None, record=None):
     """
     Play a tournament in which each player plays a game against every other player.
     :param players: a dictionary of form {'playername': playerObject}
@@ -66,6 +86,20 @@ def play_tournament(players, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode
     :param noisegrowth: maximum amount noise can grow/reduce each round
     :param noisemax: maximum level of noise in game
     :param mode: set mode of game to misimplementation (I) or misperception (P)
+    :param engine: play each game on its own ('game') or all games in lockstep as arrays ('batch')
+    :param seed: seed (int or numpy SeedSequence) that makes the tournament reproducible
+    :param retain: how much of each game is kept while it is played, see Game.set_retention.
+                   Finished games are dropped either way.
+    :param cache: take the outcome of noiseless games between deterministic strategies from OutcomeCache
+    :param payoffs: (T, R, P, S) payoffs of every game, see Game.check_payoffs
+    :param workers: number of processes the games are spread over, for very large populations (game engine only).
+                    Results are the same whatever the number of workers.
+    :param resultCache: a ResultCache.ResultCache the stats of a seeded tournament are taken from, or stored in
+    :param pairStore: a PairStore.PairStore games are taken from, or stored in (game engine only).
+                      Each game is then seeded from the players that play it, see PairStore
+    :param record: function called with the slots (places in players) of player 1 and player 2 and the game after
+                   each game is played with its full trace (game engine only, no pair store), see
+                   TraceRecorder.tournament. Games are then played even when their outcome is cached
     :return: a list of all players, each player has a dict with id and stats
 
     >>> stratlist = {Strategy.AlwaysCooperate: 1, Strategy.AlwaysDefect: 1}
@@ -80,25 +114,109 @@ def play_tournament(players, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode
     0.0
     >>> p1['scoreAvg']
     0.0
+    >>> t = play_tournament(playerlist, noisemax=0, engine='batch')
+    >>> t[1]['strategy'], t[1]['winRate'], t[1]['scoreAvg']
+    ('AllD', 1.0, 5.0)
+    >>> play_tournament(playerlist, seed=7) == play_tournament(playerlist, seed=7)
+    True
+    >>> import tempfile, ResultCache
+    >>> cache = ResultCache.ResultCache(tempfile.mkdtemp())
+    >>> t = play_tournament(playerlist, seed=7)
+    >>> [play_tournament(playerlist, seed=7, resultCache=cache) for k in range(2)] == [t, t]
+    True
+    >>> play_tournament(playerlist, noisemax=0, payoffs=(7, 5, 1, 0))[1]['scoreAvg']
+    7.0
+    >>> playerlist = create_playerlist({Strategy.TitForTat: 3, Strategy.Random: 3})
+    >>> play_tournament(playerlist, seed=7, workers=2) == play_tournament(playerlist, seed=7)
+    True
+
+    Taking outcomes from OutcomeCache doesn't change the results, the games of Random keep their seeds:
+
+    >>> playerlist = create_playerlist({Strategy.TitForTat: 2, Strategy.AlwaysDefect: 1, Strategy.Random: 2})
+    >>> t = play_tournament(playerlist, noisemax=0, seed=7)
+    >>> t == play_tournament(playerlist, noisemax=0, seed=7, cache=False)
+    True
+    >>> t == play_tournament(playerlist, noisemax=0, seed=7, workers=2)
+    True
     """
+    if engine not in ['game', 'batch']:
+        raise Exception("Engine must be 'game' or 'batch'.")
+    if workers > 1 and engine != 'game':
+        raise Exception("Workers can only be used with engine='game', the batch engine plays all games at once.")
+    if pairStore is not None and (engine != 'game' or workers > 1):
+        raise Exception("A pair store can only be used with engine='game' and one worker.")
+    if pairStore is not None and seed is None:
+        raise Exception("A pair store needs a seed, the games of an unseeded tournament are never played again.")
+    if record is not None and (engine != 'game' or pairStore is not None):
+        raise Exception("Games can only be recorded with engine='game' and no pair store.")
 
-    games = []
+    # payoffs are checked once here, as games taken from OutcomeCache never set them
+    payoffs = Game.check_payoffs(*payoffs)
 
-    # play the tournament
-    for p1 in players:
+    # only a seeded tournament always ends the same way, so only those are looked up in a result cache
+    if resultCache is not None and seed is not None and record is None:
+        cacheSettings = dict(numrounds=numrounds, noisegrowth=noisegrowth, noisemax=noisemax, mode=mode,
+                             engine=engine, payoffs=payoffs, cache=cache, pairSeeds=pairStore is not None)
+        cached = resultCache.get('tournament', players, cacheSettings, seed, idColumn='id')
+        if cached is not None:
+            return cached.to_dict('records')
+        allplayers = play_tournament(players, numrounds, noisegrowth, noisemax, mode, engine, seed, retain, cache,
+                                     payoffs, workers, pairStore=pairStore)
+        import pandas as pd
+        resultCache.put('tournament', players, cacheSettings, seed, pd.DataFrame(allplayers))
+        return allplayers
 
-        thisplayer = players[p1]
+    # every game gets its own seed from the tournament seed and its pairing, see _game_seed
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
 
-        for p2 in players:
-            if players[p2] == thisplayer:
-                break
-            else:
-                otherplayer = players[p2]
+    # a recorded game keeps every round
+    if record is not None:
+        retain = 'full'
+    settings = dict(numrounds=numrounds, noisegrowth=noisegrowth, noisemax=noisemax, mode=mode, retain=retain,
+                    cache=cache, payoffs=payoffs, record=record)
+
+    p1s = []
+    p2s = []
+    game = None
+
+    # very large tournaments spread their games over worker processes
+    if workers > 1:
+        _play_games_on_pool(players, workers, seed, settings)
+    elif pairStore is not None:
+        _play_games_with_store(players, seed, settings, pairStore)
+    else:
+        for i, p1 in enumerate(players):
 
-            game = Game.Game(thisplayer, otherplayer, numrounds, noisegrowth, noisemax)
-            game.set_mode(mode)
-            game.play_game()
-            games.append(game)
+            thisplayer = players[p1]
+
+            for j, p2 in enumerate(players):
+                if players[p2] == thisplayer:
+                    break
+                else:
+                    otherplayer = players[p2]
+
+                # noiseless games between deterministic strategies always end the same way, their outcome is cached
+                outcome = _cached_outcome(thisplayer, otherplayer, settings)
+                if outcome is not None and record is None:
+                    Game.award(thisplayer, otherplayer, *outcome, numrounds)
+                    continue
+
+                # the batch engine collects the pairings and plays them all at once below
+                if engine == 'batch':
+                    p1s.append(thisplayer)
+                    p2s.append(otherplayer)
+                    continue
+
+                game = _play_game(thisplayer, otherplayer, _game_seed(seed, i, j), settings, game)
+                if record is not None:
+                    record(i, j, game)
+
+    if p1s:
+        batch = BatchGame.BatchGame(p1s, p2s, numrounds, noisegrowth, noisemax, np.random.default_rng(seed))
+        batch.implementNoise = batch.set_mode(mode)
+        batch.payoffs = batch.set_payoffs(*payoffs)
+        batch.play_game()
 
     numgames = len(players) - 1
     # collect the stats on each player
@@ -115,47 +233,386 @@ def play_tournament(players, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode
         allplayers.append(playerdict)
 
         # reset stats for each player
-        player.points = 0
-        player.wins = 0
-        player.losses = 0
-        player.ties = 0
+        player.reset()
 
     return allplayers
 
 
-def run_MCsim(players: dict, times=1000, filename: str = None, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode='I'):
+def _cached_outcome(p1, p2, settings):
+    # scores of a game from OutcomeCache, or None if the game has to be played
+    strategies = (type(p1.strategy), type(p2.strategy))
+    if settings['cache'] and settings['noisemax'] == 0 and all(OutcomeCache.is_deterministic(s) for s in strategies):
+        return OutcomeCache.deterministic_outcome(*strategies, settings['numrounds'], settings['payoffs'],
+                                                  settings['mode'])
+    return None
+
+
+def _play_game(p1, p2, seed, settings, game=None):
+    # play one game with the game engine, which also awards both players, and return the game.
+    # The game of the previous pairing, if given, is reset and played again instead of making a new one
+    if game is None:
+        game = Game.Game(p1, p2, settings['numrounds'], settings['noisegrowth'], settings['noisemax'], seed=seed,
+                         retain=settings['retain'])
+        game.implementNoise = game.set_mode(settings['mode'])
+        game.payoffs = game.set_payoffs(*settings['payoffs'])
+    else:
+        game.reset(p1, p2, seed)
+    game.play_game()
+    return game
+
+
+def _game_seed(seed, i, j):
+    # the seed of the game between players i and j (i > j): the child of the tournament seed numbered by the pairing,
+    # as spawned in the order play_tournament plays them. Games whose outcome is cached keep their number,
+    # so taking outcomes from OutcomeCache leaves the seeds of the other games as they are
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (i * (i - 1) // 2 + j,),
+                                  pool_size=seed.pool_size)
+
+
+def _pairings(start, stop):
+    # pairings from number start to stop, in the order play_tournament plays them:
+    # player i (in the order of the players dict) against every player j before it
+    i = int((1 + math.sqrt(1 + 8 * start)) / 2)
+    while i * (i - 1) // 2 > start:
+        i -= 1
+    while (i + 1) * i // 2 <= start:
+        i += 1
+    j = start - i * (i - 1) // 2
+    for k in range(start, stop):
+        yield i, j
+        j += 1
+        if j == i:
+            i += 1
+            j = 0
+
+
+def _play_games_on_pool(players, workers, seed, settings):
+    """
+    Play every game of a tournament on a pool of worker processes and award the players afterwards.
+    The pairings are split into units of equal size, and the games of each unit come back as scores,
+    which are awarded in the order of the pairings. Each game takes the seed it would get from play_tournament
+    in a single process, so the results don't depend on the number of workers.
+    """
+    order = list(players.values())
+    pairs = len(order) * (len(order) - 1) // 2
+    size = max(1, min(pairs // (workers * 8), 10000))
+
+    units = [(start, min(start + size, pairs), seed, settings) for start in range(0, pairs, size)]
+
+    with start_pool(players, workers) as pool:
+        for (start, stop, *rest), scores in zip(units, pool.map(_run_worker_games, units)):
+            for (i, j), (p1Score, p2Score) in zip(_pairings(start, stop), scores):
+                Game.award(order[i], order[j], p1Score, p2Score, settings['numrounds'])
+
+
+def _play_games_with_store(players, seed, settings, pairStore):
+    """
+    Play every game of a tournament that isn't in a pair store yet, store it, and award the players for every game.
+    In each pairing, the player whose identity (see PairStore.identities) sorts first is player 1, so a game is the
+    same whichever order the players come in.
+    """
+    order = list(players.values())
+    names = PairStore.identities(order)
+    stored = pairStore.games(settings, seed)
+    played = []
+    game = None
+    for i in range(len(order)):
+        for j in range(i):
+            a, b = (i, j) if names[i] < names[j] else (j, i)
+            outcome = _cached_outcome(order[a], order[b], settings)
+            if outcome is None:
+                outcome = stored.get((names[a], names[b]))
+            if outcome is None:
+                game = _play_game(order[a], order[b], PairStore.game_seed(seed, names[a], names[b]), settings, game)
+                played.append((names[a], names[b], game.p1Score, game.p2Score))
+            else:
+                Game.award(order[a], order[b], *outcome, settings['numrounds'])
+    if played:
+        pairStore.add(settings, seed, played)
+
+
+def run_MCsim(players: dict, times=1000, filename: str = None, numrounds=100, noisegrowth=0.01, noisemax=0.5, mode='I',
+              engine='game', workers=1, seed=None, resume=False, checkpoint=100, format='csv', summary=False,
+              precision=None, mintimes=30, payoffs=(5, 3, 1, 0), pool=None, resultCache=None, pairStore=None,
+              trace: str = None):
     """
     run the monte carlo simulation and export the results to a csv file
     :param players: players that will be in each tournament
     :param times: how many times the tournament will be run
     :param filename: name of the csv file results will be exported to (in Results folder) - don't include '.csv'.
+                     Results are written as tournaments finish, see ResultWriter.
                      If a filename is not specified, it will return the pandas dataframe.
     :param numrounds: number of rounds played in each game
     :param noisegrowth: max noise increment
     :param noisemax: max noise per game
     :param mode: game calculates scores based on real plays (misperception, 'P') or noisy plays (misimplementation, 'I')
+    :param engine: play games one at a time ('game') or in lockstep as arrays ('batch'), see play_tournament
+    :param workers: number of processes the tournaments are spread over
+    :param seed: master seed, each tournament gets its own seed derived from it.
+                 Results are the same for a given seed, whatever the number of workers.
+    :param resume: continue an interrupted run of filename from its last checkpoint, with the same settings and seed
+    :param checkpoint: number of tournaments written to the csv file at a time
+    :param format: write the results as a csv file ('csv'), or as a folder of typed columns ('npy') that
+                   ResultWriter.read_columns memory-maps back
+    :param summary: return the per-strategy means, standard deviations and confidence intervals (see Aggregator)
+                    instead of the results table, which is then never kept in memory
+    :param precision: stop before times tournaments once the 95% confidence interval half-width of every
+                      per-strategy mean is below precision. A run written to filename that stops early is
+                      recorded as stopped by 'precision' in its manifest, with the number of tournaments written.
+                      Resuming it plays on unless the tournaments written already meet the precision
+    :param mintimes: least number of tournaments played before the run can stop early
+    :param payoffs: (T, R, P, S) payoffs of every game, see Game.check_payoffs
+    :param pool: a running worker pool from start_pool for the same players, used instead of starting a new one
+    :param resultCache: a ResultCache.ResultCache the results table of a seeded run is taken from, or stored in.
+                        Runs written to a file or summarised are not cached
+    :param pairStore: a PairStore.PairStore the games of every tournament are taken from, or stored in, so a run
+                      with a few more players than an earlier one only plays their games (see play_tournament).
+                      The run needs a seed
+    :param trace: name of a folder (in Results folder) every round of every game is recorded to, see TraceRecorder.
+                  Runs that record a trace are not cached
+
+    >>> stratlist = {Strategy.TitForTat: 2, Strategy.Random: 2}
+    >>> playerlist = create_playerlist(stratlist)
+    >>> r1 = run_MCsim(playerlist, times=4, seed=42)
+    >>> r2 = run_MCsim(playerlist, times=4, seed=42, workers=2)
+    >>> r1.equals(r2)
+    True
+    >>> r1['TournamentID'].unique().tolist()
+    [1, 2, 3, 4]
+    >>> import tempfile, ResultCache
+    >>> cache = ResultCache.ResultCache(tempfile.mkdtemp())
+    >>> run_MCsim(playerlist, times=4, seed=42, resultCache=cache).equals(r1)
+    True
+    >>> r3 = run_MCsim(create_playerlist(stratlist), times=4, seed=42, resultCache=cache)
+    >>> r3['PlayerScore'].equals(r1['PlayerScore']), r3['PlayerID'].equals(r1['PlayerID'])
+    (True, False)
+    >>> s = run_MCsim(playerlist, times=1000, seed=42, summary=True, precision=0.5, mintimes=10)
+    >>> s.index.tolist(), int(s['Count'].sum()) < 4000
+    (['TFT', 'RAND'], True)
+
+    A run that can't be recorded is rejected before any trace file is made:
+
+    >>> run_MCsim(create_playerlist({Strategy.TitForTat: 2}), times=10**6, engine='batch', trace='unused')
+    Traceback (most recent call last):
+    Exception: Games can only be recorded with engine='game' and no pair store.
+    >>> import os
+    >>> os.path.exists('Results/unused')
+    False
     """
-    tCount = 0
-    AllTournamentStats = []
-    for t in range(times):
-        tCount += 1
-        tournament = play_tournament(players, numrounds, noisegrowth, noisemax, mode)
-
-        for player in tournament:
-            tstats = {}
-            tstats['TournamentID'] = tCount
-            tstats['PlayerID'] = player['id']
-            tstats['PlayerStrategy'] = player['strategy']
-            tstats['PlayerScore'] = player['scoreAvg']
-            tstats['PlayerWinRate'] = player['winRate']
-            tstats['PlayerLossRate'] = player['lossRate']
-            tstats['PlayerTieRate'] = player['tieRate']
-            AllTournamentStats.append(tstats)
-
-    results = pd.DataFrame(AllTournamentStats)
-    results = results[['TournamentID', 'PlayerID', 'PlayerStrategy', 'PlayerScore', 'PlayerWinRate', 'PlayerLossRate', 'PlayerTieRate']]
-
-    if filename is None:
+    if pairStore is not None and seed is None:
+        raise Exception("A pair store needs a seed, the games of an unseeded run are never played again.")
+    # checked before the trace files are made, as play_tournament would only reject the run after
+    if trace is not None and (engine != 'game' or pairStore is not None):
+        raise Exception("Games can only be recorded with engine='game' and no pair store.")
+
+    settings = dict(numrounds=numrounds, noisegrowth=noisegrowth, noisemax=noisemax, mode=mode, engine=engine,
+                    payoffs=tuple(payoffs))
+
+    # a seeded run returning its results table gives the same table every time, so it can come from a result cache
+    if (resultCache is not None and seed is not None and filename is None and not summary and precision is None
+            and trace is None):
+        # tournaments of a run take the outcome of noiseless deterministic games from OutcomeCache (cache=True)
+        cacheSettings = dict(settings, times=times, cache=True, pairSeeds=pairStore is not None)
+        cached = resultCache.get('run', players, cacheSettings, seed)
+        if cached is not None:
+            return cached
+        results = run_MCsim(players, times, numrounds=numrounds, noisegrowth=noisegrowth, noisemax=noisemax,
+                            mode=mode, engine=engine, workers=workers, seed=seed, payoffs=payoffs, pool=pool,
+                            pairStore=pairStore)
+        resultCache.put('run', players, cacheSettings, seed, results)
         return results
+
+    start = 1
+    writer = None
+    if filename is not None:
+        # a run needs a known seed to be resumed, so one is drawn here if none was given
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        if format == 'csv':
+            writer = ResultWriter.ResultWriter('Results/' + filename + '.csv', resultColumns, checkpoint)
+        elif format == 'npy':
+            categories = {'PlayerID': list(players),
+                          'PlayerStrategy': list(dict.fromkeys(p.strategy.id for p in players.values()))}
+            writer = ResultWriter.ColumnWriter('Results/' + filename, resultTypes, times * len(players), categories,
+                                               checkpoint)
+        else:
+            raise Exception("Format must be 'csv' or 'npy'.")
+        runSettings = dict(settings, times=times,
+                           players={name: player.strategy.id for name, player in players.items()})
+        start, seed = writer.open(runSettings, seed, resume)
+
+    recorder = None
+    if trace is not None:
+        recorder = TraceRecorder.TraceRecorder('Results/' + trace, players, times, numrounds, mode, resume=start > 1)
+
+    # each tournament goes with its own settings, which hold where its games are recorded
+    tournamentSeeds = np.random.SeedSequence(seed).spawn(times)
+    tournaments = ((tCount, tSeed, dict(settings, pairStore=pairStore,
+                                        record=recorder and recorder.tournament(tCount)))
+                   for tCount, tSeed in zip(range(start, times + 1), tournamentSeeds[start - 1:]))
+
+    ownPool = pool is None and workers > 1
+    if ownPool:
+        pool = start_pool(players, workers)
+    if pool is not None and writer is None and not summary and precision is None:
+        # workers write the results table straight into shared memory, only TournamentIDs come back through the pool
+        try:
+            return _run_on_shared_results(pool, players, times, tournaments, workers * 4)
+        finally:
+            if ownPool:
+                pool.shutdown()
+            if recorder is not None:
+                recorder.close()
+    if pool is not None:
+        chunks = _ordered_results(pool, tournaments, workers * 4)
     else:
-        results.to_csv('Results/' + filename + '.csv', index=False)
+        chunks = (tournament_rows(tCount, play_tournament(players, seed=tSeed, **tSettings))
+                  for tCount, tSeed, tSettings in tournaments)
+
+    aggregator = None
+    stopped = None
+    if summary or precision is not None:
+        aggregator = Aggregator.Aggregator()
+        if writer is not None and start > 1:
+            # a resumed run picks up the statistics of the tournaments already written
+            for written in writer.written():
+                aggregator.update(written.to_dict('records'))
+            # a run that stopped early stays stopped when it is resumed with the same precision
+            if precision is not None and start - 1 >= mintimes and aggregator.converged(precision):
+                chunks = ()
+                stopped = 'precision'
+
+    AllTournamentStats = []
+    try:
+        # rows of each tournament are handed to the writer as it finishes, only a checkpoint's worth is kept in memory
+        for chunk in chunks:
+            tCount = chunk[0]['TournamentID']
+            if writer is not None:
+                writer.write(tCount, chunk)
+            elif not summary:
+                AllTournamentStats.extend(chunk)
+            if aggregator is not None:
+                aggregator.update(chunk)
+                if precision is not None and tCount >= mintimes and aggregator.converged(precision):
+                    stopped = 'precision' if tCount < times else None
+                    break
+        if writer is not None:
+            writer.close(stopped)
+    finally:
+        if ownPool:
+            pool.shutdown()
+        if recorder is not None:
+            recorder.close()
+
+    if summary:
+        return aggregator.summary()
+    if writer is None:
+        # pandas is only imported once a dataframe is built, so runs that write to a file start without it
+        import pandas as pd
+        return pd.DataFrame(AllTournamentStats, columns=resultColumns)
+
+
+def _ordered_results(pool, tournaments, window, task=None):
+    # keep at most window tournaments queued on the pool and yield what task returns for each (by default
+    # their rows) in order, so a run that stops early leaves little work behind
+    pending = deque()
+    try:
+        for tournament in tournaments:
+            pending.append(pool.submit(task or _run_worker_tournament, tournament))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _run_on_shared_results(pool, players, times, tournaments, window):
+    # play tournaments on a pool into a SharedResults block, then copy the block out as the results table
+    strategies = list(dict.fromkeys(player.strategy.id for player in players.values()))
+    codes = {strategy: code for code, strategy in enumerate(strategies)}
+    with SharedResults.SharedResults(times, len(players)) as results:
+        tasks = ((tCount, tSeed, settings, (results.name, times, codes)) for tCount, tSeed, settings in tournaments)
+        for tCount in _ordered_results(pool, tasks, window, _run_worker_into_buffer):
+            pass
+        return results.dataframe(list(players), strategies)
+
+
+def tournament_rows(tCount, tournament):
+    """
+    turn the player stats returned by play_tournament into rows of the monte carlo results table
+    :param tCount: the TournamentID of the tournament
+    :param tournament: list of player dicts, as returned by play_tournament
+    :return: a list of dicts, one per player, with keys resultColumns
+    """
+    rows = []
+    for player in tournament:
+        tstats = {}
+        tstats['TournamentID'] = tCount
+        tstats['PlayerID'] = player['id']
+        tstats['PlayerStrategy'] = player['strategy']
+        tstats['PlayerScore'] = player['scoreAvg']
+        tstats['PlayerWinRate'] = player['winRate']
+        tstats['PlayerLossRate'] = player['lossRate']
+        tstats['PlayerTieRate'] = player['tieRate']
+        rows.append(tstats)
+    return rows
+
+
+def start_pool(players: dict, workers: int):
+    """
+    start a pool of worker processes that play tournaments between players, so several runs can share it
+    :param players: players that will be in each tournament, sent to each worker once
+    :param workers: number of worker processes
+    :return: a concurrent.futures ProcessPoolExecutor, to be shut down by the caller
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(players,))
+
+
+# players of a worker process, sent once when the worker starts
+_workerPlayers = None
+
+# SharedResults block a worker process writes into, by name
+_workerResults = {}
+
+
+def _init_worker(players):
+    global _workerPlayers
+    _workerPlayers = players
+
+
+def _run_worker_games(unit):
+    start, stop, seed, settings = unit
+    order = list(_workerPlayers.values())
+    scores = []
+    played = None
+    for i, j in _pairings(start, stop):
+        outcome = _cached_outcome(order[i], order[j], settings)
+        # games with a cached outcome are only played to be recorded
+        if outcome is None or settings['record'] is not None:
+            played = _play_game(order[i], order[j], _game_seed(seed, i, j), settings, played)
+            if settings['record'] is not None:
+                settings['record'](i, j, played)
+            if outcome is None:
+                outcome = played.p1Score, played.p2Score
+        scores.append(outcome)
+    return scores
+
+
+def _run_worker_tournament(tournament):
+    tCount, tSeed, settings = tournament
+    return tournament_rows(tCount, play_tournament(_workerPlayers, seed=tSeed, **settings))
+
+
+def _run_worker_into_buffer(tournament):
+    tCount, tSeed, settings, (name, times, codes) = tournament
+    if name not in _workerResults:
+        # a worker moves on to the block of the next run, letting go of the last one
+        for results in _workerResults.values():
+            results.close()
+        _workerResults.clear()
+        _workerResults[name] = SharedResults.SharedResults(times, len(_workerPlayers), name=name)
+    _workerResults[name].write(tCount, play_tournament(_workerPlayers, seed=tSeed, **settings), codes)
+    return tCount
@@ -0,0 +1,165 @@
+import functools
+import json
+import os
+import uuid
+
+import numpy as np
+
+import Game
+
+# index of the games in a trace, one row per game: its tournament, the slots (places in the players dict) of
+# player 1 and player 2, and the offset of its first round in the flattened moves and noise files
+indexType = [('TournamentID', 'int32'), ('P1', 'uint16'), ('P2', 'uint16'), ('Offset', 'int64')]
+
+# tables turning trace codes into History round codes (2 * first move + second move, C = 0 and D = 1) of each view
+views = {'real': Game.realView, 'p1': Game.p1View, 'p2': Game.p2View, 'noisy': Game.noisyView}
+
+# arrays of the traces open in this process, by path and run, so worker processes open them once
+_openArrays = {}
+
+
+class TraceRecorder:
+    """TraceRecorder class - records every round of every game of a monte carlo run to memory-mapped files,
+    so the rounds of millions of games can be analysed later without holding them in memory.
+    A folder holds 'moves.npy', one trace code per round as Game keeps it (real moves, and whether noise flipped
+    each player's move, see Game.trace) as uint8, 'noise.npy', the noise level at the start of each round as
+    float32, both of shape (games, rounds), and 'games.npy', the index of the games (see indexType).
+    The files are preallocated for the whole run and each game has its own row, from its tournament and its
+    pairing, so worker processes write their games in place. Games not played (yet) have TournamentID 0.
+    See read_trace to memory-map a trace back.
+
+    >>> import tempfile, Strategy, Tournament
+    >>> path = os.path.join(tempfile.mkdtemp(), 'trace')
+    >>> players = Tournament.create_playerlist({Strategy.TitForTat: 1, Strategy.AlwaysDefect: 1, Strategy.Random: 1})
+    >>> recorder = TraceRecorder(path, players, times=2, rounds=10)
+    >>> t = Tournament.play_tournament(players, numrounds=10, noisemax=0, seed=1, record=recorder.tournament(2))
+    >>> trace = read_trace(path)
+    >>> trace['games']['TournamentID'].tolist(), trace['games']['P1'].tolist(), trace['games']['P2'].tolist()
+    ([0, 0, 0, 2, 2, 2], [0, 0, 0, 1, 2, 2], [0, 0, 0, 0, 0, 1])
+    >>> decode(trace['moves'][3], 'real').tolist()[:3], bool((trace['moves'] >> 2).any())
+    ([2, 3, 3], False)
+    """
+
+    def __init__(self, path: str, players: dict, times: int, rounds: int, mode='I', resume=False):
+        """
+        :param path: folder the trace is written to
+        :param players: players that will be in each tournament
+        :param times: number of tournaments in the run
+        :param rounds: number of rounds in each game
+        :param mode: game mode of the run, misimplementation (I) or misperception (P), which decides the payoff moves
+        :param resume: keep the games already recorded in path by an interrupted run of the same players and settings
+        """
+        self.path = path
+        n = len(players)
+        self.layout = {'players': list(players), 'strategies': [p.strategy.id for p in players.values()],
+                       'times': times, 'rounds': rounds, 'pairings': n * (n - 1) // 2,
+                       'implementNoise': Game.check_mode(mode), 'run': uuid.uuid4().hex}
+        if resume and os.path.exists(os.path.join(path, 'trace.json')):
+            with open(os.path.join(path, 'trace.json')) as f:
+                recorded = json.load(f)
+            if dict(recorded, run=None) != dict(self.layout, run=None):
+                raise Exception("Trace {} was recorded with different players or settings.".format(path))
+            self.layout = recorded
+            return
+        games = times * self.layout['pairings']
+        os.makedirs(path, exist_ok=True)
+        for name, dtype, shape in [('moves', 'uint8', (games, rounds)), ('noise', 'float32', (games, rounds)),
+                                   ('games', indexType, (games,))]:
+            np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=dtype, shape=shape).flush()
+        with open(os.path.join(path, 'trace.json'), 'w') as f:
+            json.dump(self.layout, f, indent=2)
+
+    def __getstate__(self):
+        # a recorder sent to a worker process takes its path and layout, the files are opened there
+        return {'path': self.path, 'layout': self.layout}
+
+    @property
+    def arrays(self):
+        key = (self.path, self.layout['run'])
+        if key not in _openArrays:
+            # a worker moves on to the trace of the next run, letting go of the last one
+            for arrays in _openArrays.values():
+                for array in arrays.values():
+                    array.flush()
+            _openArrays.clear()
+            _openArrays[key] = {name: np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r+')
+                                for name in ['moves', 'noise', 'games']}
+        return _openArrays[key]
+
+    def tournament(self, tCount):
+        """
+        The record function of one tournament, to be passed to Tournament.play_tournament as record
+        :param tCount: the TournamentID of the tournament
+        """
+        return functools.partial(self.record, tCount)
+
+    def record(self, tCount, p1: int, p2: int, game: Game.Game):
+        """
+        Record a game that was played with the full trace (retain='full')
+        :param tCount: the TournamentID of the game's tournament
+        :param p1: slot of player 1, its place in the players dict
+        :param p2: slot of player 2
+        :param game: the game, after play_game()
+        """
+        i, j = max(p1, p2), min(p1, p2)
+        row = (tCount - 1) * self.layout['pairings'] + i * (i - 1) // 2 + j
+        arrays = self.arrays
+        arrays['moves'][row] = np.frombuffer(game.trace, dtype=np.uint8)
+        arrays['noise'][row] = np.frombuffer(game.noiseTrace, dtype=np.float64)
+        arrays['games'][row] = (tCount, p1, p2, row * self.layout['rounds'])
+
+    def close(self):
+        """Flush the trace to disk and let go of the files in this process"""
+        arrays = _openArrays.pop((self.path, self.layout['run']), {})
+        for array in arrays.values():
+            array.flush()
+
+
+def read_trace(path: str):
+    """
+    Memory-map a trace written by TraceRecorder, without reading it into memory
+    :param path: folder of the trace
+    :return: a dict with the arrays moves, noise and games, and layout, the settings of the trace
+    """
+    with open(os.path.join(path, 'trace.json')) as f:
+        layout = json.load(f)
+    trace = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in ['moves', 'noise', 'games']}
+    trace['layout'] = layout
+    return trace
+
+
+def decode(moves, view='real'):
+    """
+    Turn trace codes into History round codes (2 * first move + second move, C = 0 and D = 1) as seen from a view:
+    'real' moves, player 1's perceived history ('p1', its own move and player 2's move as noise left it), player 2's
+    ('p2', its own move first) or the 'noisy' moves. The payoff moves are the noisy moves in misimplementation mode
+    and the real moves in misperception mode, see payoff_view.
+
+    >>> codes = np.array([0b0110], dtype=np.uint8)
+    >>> decode(codes, 'real').tolist(), decode(codes, 'p1').tolist(), decode(codes, 'noisy').tolist()
+    ([2], [2], [0])
+    """
+    return np.frombuffer(views[view], dtype=np.uint8)[moves]
+
+
+def payoff_view(trace):
+    """This returns the view of the moves payoffs were awarded on in a trace, for decode"""
+    return 'noisy' if trace['layout']['implementNoise'] else 'real'
+
+
+def mean_noise(path: str, chunk=100000):
+    """
+    Mean noise level at the start of each round over every game recorded in a trace, read in chunks of games,
+    so it runs in bounded memory whatever the size of the trace
+    :param path: folder of the trace
+    :param chunk: number of games read at a time
+    :return: an array of one mean per round
+    """
+    trace = read_trace(path)
+    total = np.zeros(trace['layout']['rounds'])
+    count = 0
+    for start in range(0, len(trace['games']), chunk):
+        played = trace['games']['TournamentID'][start:start + chunk] > 0
+        total += trace['noise'][start:start + chunk][played].sum(axis=0, dtype=np.float64)
+        count += int(played.sum())
+    return total / max(count, 1)
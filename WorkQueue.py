@@ -0,0 +1,311 @@
+import argparse
+import csv
+import json
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+import Player
+import Strategy
+import Tournament
+
+# game settings of a queued run, with the values used when they are left out
+runSettings = {'numrounds': 100, 'noisegrowth': 0.01, 'noisemax': 0.5, 'mode': 'I', 'engine': 'game',
+               'payoffs': [5, 3, 1, 0]}
+
+
+def publish(players: dict, queue: str, times=1000, shardSize=10, seed=None, **settings):
+    """
+    Split a monte carlo run into shards of tournaments and publish them to a work queue: a folder that workers
+    on any host that mounts it can claim shards from (see work). Tournaments are seeded as in Tournament.run_MCsim,
+    so the merged results of a queue are the results run_MCsim gives with the same seed.
+    Publishing the same run to a queue again leaves it as it is, so a coordinator can be restarted.
+    :param players: players that will be in each tournament
+    :param queue: folder of the queue, created if it doesn't exist
+    :param times: how many times the tournament is run
+    :param shardSize: number of tournaments in a shard
+    :param seed: master seed of the run, one is drawn if not given
+    :param settings: game settings of the run, from runSettings
+    :return: the master seed of the run
+    """
+    for setting in settings:
+        if setting not in runSettings:
+            raise Exception("Unknown setting {}, a queued run can set {}.".format(setting, ', '.join(runSettings)))
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    settings = dict(runSettings, **settings)
+    settings['payoffs'] = list(settings['payoffs'])
+    run = {'players': [[name, type(player.strategy).__name__] for name, player in players.items()],
+           'settings': settings, 'times': times, 'shardSize': shardSize, 'seed': seed}
+
+    for folder in ['leases', 'results']:
+        os.makedirs(os.path.join(queue, folder), exist_ok=True)
+    path = os.path.join(queue, 'run.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            published = json.load(f)
+        if published != json.loads(json.dumps(run)):
+            raise Exception("Queue {} already holds a different run.".format(queue))
+        return published['seed']
+    _write_atomic(path, json.dumps(run, indent=2))
+    return seed
+
+
+def work(queue: str, worker: str = None, lease=300, wait=True, poll=1.0):
+    """
+    Claim shards of a work queue one at a time and play their tournaments, until every shard is finished.
+    A claim is a lease file in the queue's 'leases' folder, created atomically, and renewed after each tournament.
+    A shard whose lease has expired (its worker died or lost the folder) is claimed again by the next worker that
+    finds it. Results of a shard are written to a temporary file and moved into the 'results' folder when complete,
+    so a shard is never half written. Should two workers ever play the same shard, they write the same results, as
+    tournaments are seeded from the run. Leases compare wall clock times, so the clocks of the hosts sharing a queue
+    should agree to well within lease.
+    :param queue: folder of the queue
+    :param worker: name of this worker, the host name and process id if not given
+    :param lease: seconds a claim holds without being renewed
+    :param wait: while shards are claimed by other workers, wait for them to finish or expire
+    :param poll: seconds between looks at the queue while waiting
+    :return: number of shards this worker finished
+    """
+    if worker is None:
+        worker = '{}-{}'.format(socket.gethostname(), os.getpid())
+    run = _read_run(queue)
+    players = {name: Player.Player(getattr(Strategy, strategy), name=name) for name, strategy in run['players']}
+    tournamentSeeds = np.random.SeedSequence(run['seed']).spawn(run['times'])
+    finished = 0
+    while True:
+        shard = claim(queue, worker, lease)
+        if shard is None:
+            pending = status(queue)['pending']
+            if not pending or not wait:
+                return finished
+            time.sleep(poll)
+            continue
+
+        start, stop = _shard_range(run, shard)
+        temp = os.path.join(queue, 'results', '{}.{}.tmp'.format(_shard_name(shard), worker))
+        with open(temp, 'w', newline='') as f:
+            writer = csv.DictWriter(f, Tournament.resultColumns, lineterminator='\n')
+            for tCount in range(start, stop):
+                tournament = Tournament.play_tournament(players, seed=tournamentSeeds[tCount - 1], **run['settings'])
+                writer.writerows(Tournament.tournament_rows(tCount, tournament))
+                # a worker that lost its claim stops, the shard is finished by the worker that took it over
+                if not _renew(queue, shard, worker, lease):
+                    break
+            else:
+                f.flush()
+                os.fsync(f.fileno())
+        if _owns(queue, shard, worker):
+            os.replace(temp, _result_path(queue, shard))
+            _release(queue, shard)
+            finished += 1
+        else:
+            os.remove(temp)
+
+
+def claim(queue: str, worker: str, lease=300):
+    """
+    Claim the first shard of a queue that is neither finished nor claimed under a lease that still holds
+    :return: the shard number, or None if every shard is finished or claimed
+    """
+    run = _read_run(queue)
+    for shard in range(_shard_count(run)):
+        if os.path.exists(_result_path(queue, shard)):
+            continue
+        path = _lease_path(queue, shard)
+        held = _read_lease(path)
+        if held is not None:
+            if held['expires'] > time.time():
+                continue
+            # an expired lease is moved out of the way first, only one worker can succeed in moving it
+            stale = '{}.{}.stale'.format(path, worker)
+            try:
+                os.rename(path, stale)
+            except FileNotFoundError:
+                continue
+            os.remove(stale)
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        with os.fdopen(descriptor, 'w') as f:
+            json.dump({'worker': worker, 'expires': time.time() + lease}, f)
+        # the shard may have been finished between the check above and the claim
+        if os.path.exists(_result_path(queue, shard)):
+            _release(queue, shard)
+            continue
+        return shard
+    return None
+
+
+def status(queue: str):
+    """
+    How far a queue has come
+    :return: a dict with the number of shards finished, claimed (under a lease that holds), expired and pending
+             (not finished)
+    """
+    run = _read_run(queue)
+    counts = {'shards': _shard_count(run), 'finished': 0, 'claimed': 0, 'expired': 0, 'pending': 0}
+    now = time.time()
+    for shard in range(counts['shards']):
+        if os.path.exists(_result_path(queue, shard)):
+            counts['finished'] += 1
+            continue
+        counts['pending'] += 1
+        lease = _read_lease(_lease_path(queue, shard))
+        if lease is not None:
+            counts['claimed' if lease['expires'] > now else 'expired'] += 1
+    return counts
+
+
+def merge(queue: str, filename: str = None):
+    """
+    Merge the results of every shard of a queue into the standard results table, as run_MCsim gives it
+    :param queue: folder of the queue
+    :param filename: name of the csv file results are written to (in Results folder) - don't include '.csv'.
+                     If not given, the pandas dataframe is returned.
+
+    >>> import shutil, subprocess, tempfile
+    >>> queue = tempfile.mkdtemp()
+    >>> players = Tournament.create_playerlist({Strategy.TitForTat: 2, Strategy.Random: 2})
+    >>> publish(players, queue, times=7, shardSize=2, seed=5)
+    5
+
+    A lease left by a worker that died expires, and its shard is played again:
+
+    >>> claim(queue, 'lost', lease=0)
+    0
+    >>> workers = [subprocess.Popen([sys.executable, '-m', 'WorkQueue', 'work', queue, '--poll', '0.1'],
+    ...                             cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+    ...            for k in range(3)]
+    >>> [w.wait() for w in workers]
+    [0, 0, 0]
+    >>> status(queue)
+    {'shards': 4, 'finished': 4, 'claimed': 0, 'expired': 0, 'pending': 0}
+    >>> merge(queue).equals(Tournament.run_MCsim(players, times=7, seed=5))
+    True
+    >>> shutil.rmtree(queue)
+    """
+    import pandas as pd
+    counts = status(queue)
+    if counts['pending']:
+        raise Exception("{} of {} shards in {} are not finished.".format(counts['pending'], counts['shards'], queue))
+
+    paths = [_result_path(queue, shard) for shard in range(counts['shards'])]
+    if filename is None:
+        results = [pd.read_csv(path, header=None, names=Tournament.resultColumns, float_precision='round_trip')
+                   for path in paths]
+        return pd.concat(results, ignore_index=True)
+
+    # shard files are copied one after another, so a run of any size fits in memory
+    with open('Results/' + filename + '.csv', 'w', newline='') as out:
+        csv.writer(out, lineterminator='\n').writerow(Tournament.resultColumns)
+        for path in paths:
+            with open(path, newline='') as f:
+                for block in iter(lambda: f.read(1 << 20), ''):
+                    out.write(block)
+
+
+def _read_run(queue):
+    with open(os.path.join(queue, 'run.json')) as f:
+        return json.load(f)
+
+
+def _shard_count(run):
+    return -(-run['times'] // run['shardSize'])
+
+
+def _shard_range(run, shard):
+    # TournamentIDs of a shard, from start up to stop
+    start = shard * run['shardSize'] + 1
+    return start, min(start + run['shardSize'], run['times'] + 1)
+
+
+def _shard_name(shard):
+    return '{:06d}'.format(shard)
+
+
+def _result_path(queue, shard):
+    return os.path.join(queue, 'results', _shard_name(shard) + '.csv')
+
+
+def _lease_path(queue, shard):
+    return os.path.join(queue, 'leases', _shard_name(shard) + '.lease')
+
+
+def _read_lease(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # a lease is being written or was just released
+        return None
+
+
+def _owns(queue, shard, worker):
+    lease = _read_lease(_lease_path(queue, shard))
+    return lease is not None and lease['worker'] == worker
+
+
+def _renew(queue, shard, worker, lease):
+    if not _owns(queue, shard, worker):
+        return False
+    _write_atomic(_lease_path(queue, shard), json.dumps({'worker': worker, 'expires': time.time() + lease}))
+    return True
+
+
+def _release(queue, shard):
+    try:
+        os.remove(_lease_path(queue, shard))
+    except FileNotFoundError:
+        pass
+
+
+def _write_atomic(path, text):
+    # hosts sharing a queue can have processes with the same id, so the temporary file is named by both
+    temp = '{}.{}-{}.tmp'.format(path, socket.gethostname(), os.getpid())
+    with open(temp, 'w') as f:
+        f.write(text)
+    os.replace(temp, path)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the monte carlo simulation over a shared-folder work queue.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    publishParser = commands.add_parser('publish', help='split the run of a Simulate config into shards')
+    publishParser.add_argument('config', help='JSON config, as for Simulate (players, times, seed, game settings)')
+    publishParser.add_argument('queue', help='folder of the queue')
+    publishParser.add_argument('--shard', type=int, default=10, help='tournaments per shard (default 10)')
+    workParser = commands.add_parser('work', help='claim and play shards until the queue is finished')
+    workParser.add_argument('queue', help='folder of the queue')
+    workParser.add_argument('--lease', type=float, default=300, help='seconds a claim holds (default 300)')
+    workParser.add_argument('--poll', type=float, default=1.0, help='seconds between looks at the queue')
+    workParser.add_argument('--worker', help='name of the worker, host name and process id by default')
+    mergeParser = commands.add_parser('merge', help='merge the results of a finished queue')
+    mergeParser.add_argument('queue', help='folder of the queue')
+    mergeParser.add_argument('output', help='name of the results in the Results folder, without extension')
+    args = parser.parse_args(args)
+
+    if args.command == 'publish':
+        import Simulate
+        with open(args.config) as f:
+            config = Simulate.read_config(json.load(f))
+        players = Tournament.create_playerlist({Simulate.strategy_class(name): count
+                                                for name, count in config['players'].items()})
+        seed = publish(players, args.queue, config['times'], args.shard, config['seed'],
+                       **{setting: config[setting] for setting in runSettings})
+        print('Published {} with seed {}'.format(args.queue, seed))
+    elif args.command == 'work':
+        finished = work(args.queue, args.worker, args.lease, poll=args.poll)
+        print('Finished {} shards of {}'.format(finished, args.queue))
+    else:
+        merge(args.queue, args.output)
+        print('Results written to Results/{}.csv'.format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())